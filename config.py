@@ -11,9 +11,41 @@ DATA_FOLDER = os.path.join(APP_DATA_FOLDER, "data")
 INPUT_FOLDER = os.path.join(DATA_FOLDER, "input")
 RESULTS_FOLDER = os.path.join(DATA_FOLDER, "results")
 USER_FOLDER = os.path.join(DATA_FOLDER, "user")
+SNAPSHOT_CACHE_FOLDER = os.path.join(DATA_FOLDER, "cache")
 
-NUMBER_OF_USES_FILE = os.path.join(USER_FOLDER, "number_of_uses.txt")
+NUMBER_OF_USES_FILE = os.path.join(USER_FOLDER, "number_of_uses.txt") # legacy use counter, imported into the run history database
+RUN_HISTORY_DATABASE = os.path.join(USER_FOLDER, "run_history.db")
+RUN_HISTORY_BATCH_SIZE = 50 # maximum number of runs written to the run history database in one transaction
+RUN_HISTORY_FLUSH_SECONDS = 2 # how long the run history writer waits to gather a batch before writing it
+SETTINGS_FILE = os.path.join(USER_FOLDER, "settings.json") # choices kept between sessions, e.g. whether the input folder is watched
+PROCESSED_FILES_FILE = os.path.join(USER_FOLDER, "processed_files.json") # the version of each watched file that was last processed, so files added while the app was closed are still processed
 
-ALL_FOLDERS = [APP_DATA_FOLDER, DATA_FOLDER, INPUT_FOLDER, RESULTS_FOLDER, USER_FOLDER]
+ALL_FOLDERS = [APP_DATA_FOLDER, DATA_FOLDER, INPUT_FOLDER, RESULTS_FOLDER, USER_FOLDER, SNAPSHOT_CACHE_FOLDER]
 
 RELEASE_LINK = "https://github.com/davindergw/geneMatcher/releases"
+
+SPREADSHEET_EXTENSIONS = [".xls", ".xlsx", ".ods"]
+TEXT_EXTENSIONS = [".csv", ".tsv", ".txt"]
+COMPRESSION_EXTENSIONS = [".gz", ".bz2"] # single files that are decompressed while they are read
+ARCHIVE_EXTENSIONS = [".zip"] # archives are treated as a batch of input files
+DATABASE_EXTENSIONS = [".sqlite", ".db"] # results saved as an indexed SQLite database instead of a spreadsheet
+
+OUTPUT_MODES = ["positions", "genes-only", "counts"] # what the results report for each gene: every row it is on, nothing else, or how many times it appears
+
+MAX_WORKERS = min(4, os.cpu_count() or 1) # number of input files processed at the same time
+
+WATCH_POLL_SECONDS = 1 # how often the input folder is checked for new or modified files
+WATCH_SETTLE_SECONDS = 2 # a file must stay the same size and age for this long before it is processed, so partly written files are skipped
+
+SNAPSHOT_CACHE_MAX_BYTES = 500 * 1024 * 1024 # once the parsed input cache is bigger than this, the least recently used snapshots are deleted
+SNAPSHOT_EVICTION_GRACE_SECONDS = 60 # snapshots written or read more recently than this are never deleted, as another process may still be using them
+
+DISTRIBUTED_PORT = 8765 # port the coordinator listens on when matching is shared between worker processes or machines
+DISTRIBUTED_HOST = "127.0.0.1" # only workers on this machine can reach the coordinator unless another address (e.g. 0.0.0.0) is given
+DISTRIBUTED_TOKEN_VARIABLE = "GENE_MATCHER_TOKEN" # environment variable holding the token workers must send to the coordinator
+DISTRIBUTED_POLL_SECONDS = 1 # how long an idle worker waits before asking the coordinator for work again
+DISTRIBUTED_LEASE_SECONDS = 600 # a job not finished within this time is given to another worker, in case its worker has stopped
+DISTRIBUTED_STEAL_SECONDS = 60 # once no jobs are waiting, idle workers also run jobs that have been running for longer than this
+DISTRIBUTED_MAX_ATTEMPTS = 3 # a job that fails this many times is marked as failed
+DISTRIBUTED_REQUEST_ATTEMPTS = 5 # a worker sends its results or a failure up to this many times before giving up on the job
+DISTRIBUTED_RETRY_SECONDS = 1 # wait before a worker's first retry, doubled after each retry
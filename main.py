@@ -4,21 +4,86 @@ Licensed under the Creative Commons Attribution-NonCommercial 4.0 International
 See LICENSE file for details: https://creativecommons.org/licenses/by-nc/4.0/
 """
 import sys
+import os
 sys.dont_write_bytecode = True #stops python from caching files in modules folder
 import config
+import argparse
 import traceback
 from tkinter import messagebox
 from modules.gui import setup_gui
 from modules.fileHandler import setup_file_structure
+from modules.userDataHandler import setup_run_history
+from modules.distributedMatcher import start_coordinator, wait_for_coordinator, run_worker, run_local_cluster
+from modules.documentGenerator import create_summary_options
+from modules.folderWatcher import run_headless_watch
+
+"""
+FUNCTIONS
+
+def use_console_messages
+def parse_arguments
+def bootstrap_app
+"""
+
+def use_console_messages():
+    """
+    Prints error and warning messages to the console instead of showing pop ups.
+    Used when running as a coordinator or worker, which may have no screen attached.
+    """
+    def print_message(title, message, **options):
+        print(f"{title}: {message}", file=sys.stderr)
+
+    messagebox.showerror = print_message
+    messagebox.showwarning = print_message
+
+def parse_arguments():
+    """
+    Reads the command line options. With no options the app opens as normal.
+    """
+    parser = argparse.ArgumentParser(description="Gene Matcher")
+    parser.add_argument("--coordinator", nargs="+", metavar="FILE", help="share matching of these files between workers")
+    parser.add_argument("--port", type=int, default=config.DISTRIBUTED_PORT, help="port the coordinator listens on")
+    parser.add_argument("--host", default=config.DISTRIBUTED_HOST, help="address the coordinator listens on, e.g. 0.0.0.0 to accept workers on other machines")
+    parser.add_argument("--token", default=os.environ.get(config.DISTRIBUTED_TOKEN_VARIABLE), help=f"token shared by the coordinator and its workers (defaults to the {config.DISTRIBUTED_TOKEN_VARIABLE} environment variable)")
+    parser.add_argument("--local-workers", type=int, metavar="N", help="start N worker processes on this machine for the coordinator")
+    parser.add_argument("--columns", nargs="+", metavar="COLUMN", help="columns to match (defaults to the first two)")
+    parser.add_argument("--output", choices=config.OUTPUT_MODES, default=config.OUTPUT_MODES[0], help="report every position, just the genes, or how many times each gene appears")
+    parser.add_argument("--min-occurrences", type=int, metavar="N", help="only report genes appearing at least N times in total")
+    parser.add_argument("--top", type=int, metavar="K", help="only report the K genes appearing the most times")
+    parser.add_argument("--worker", metavar="URL", help="process jobs from the coordinator at this URL, e.g. http://host:8765")
+    parser.add_argument("--watch", nargs="?", const=config.INPUT_FOLDER, metavar="FOLDER", help="process files added to the folder (defaults to the input folder) without opening the app")
+    parser.add_argument("--results-format", choices=[".xlsx", ".ods", ".csv", ".tsv", ".sqlite"], help="format --watch saves results in (defaults to the format of each input file)")
+    return parser.parse_args()
 
 def bootstrap_app():
     """
     Dispays the button to see the results file
     """
     try:
-        
+        arguments = parse_arguments()
         setup_file_structure()
-        setup_gui()
+
+        if arguments.worker:
+            use_console_messages()
+            setup_run_history() # workers record each job they process, like the app does
+            run_worker(arguments.worker, token=arguments.token)
+        elif arguments.coordinator and arguments.local_workers:
+            use_console_messages()
+            summary_options = create_summary_options(arguments.output, arguments.min_occurrences, arguments.top)
+            run_local_cluster(arguments.coordinator, arguments.local_workers, arguments.columns, summary_options)
+        elif arguments.coordinator:
+            use_console_messages()
+            summary_options = create_summary_options(arguments.output, arguments.min_occurrences, arguments.top)
+            server, state = start_coordinator(arguments.coordinator, arguments.port, arguments.columns, arguments.host, summary_options, arguments.token)
+            wait_for_coordinator(server, state)
+        elif arguments.watch:
+            use_console_messages()
+            setup_run_history()
+            summary_options = create_summary_options(arguments.output, arguments.min_occurrences, arguments.top)
+            run_headless_watch(arguments.watch, arguments.columns, summary_options, arguments.results_format)
+        else:
+            setup_run_history()
+            setup_gui()
         
     except Exception as e:
         traceback.print_exc()
@@ -0,0 +1,427 @@
+"""
+This file is part of Gene Matcher.
+Licensed under the Creative Commons Attribution-NonCommercial 4.0 International License.
+See LICENSE file for details: https://creativecommons.org/licenses/by-nc/4.0/
+"""
+import config
+import os
+import sys
+import json
+import time
+import uuid
+import hmac
+import secrets
+import socket
+import zipfile
+import threading
+import subprocess
+import traceback
+import urllib.request
+import urllib.error
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from tkinter import messagebox
+import pandas as pd
+from .documentGenerator import generate_document, generate_document_from_archive_member
+from .userDataHandler import create_run_stats, record_run
+from .fileHandler import save_file, get_file_extension, get_source_extensions, get_source_stem, reserve_unique_file_name, list_archive_members, remove_file
+
+"""
+Shares the matching of many input files between worker processes, on one machine or several.
+
+The coordinator holds the list of jobs and answers HTTP requests from the workers:
+
+    POST /claim     a worker asks for a job. Idle workers pull the next job, so fast workers
+                    naturally take more of them. Once no jobs are waiting, jobs that have been
+                    running for longer than DISTRIBUTED_STEAL_SECONDS are given out again, and
+                    whichever worker finishes first wins
+    POST /complete  a worker sends back the results of a job, which the coordinator saves
+    POST /fail      a worker reports that a job failed, and it is retried up to DISTRIBUTED_MAX_ATTEMPTS times
+
+Every request must carry the coordinator's token in the X-Gene-Matcher-Token header, so only
+workers that have been given the token can read the job list or send back results.
+
+Each worker runs the normal generate_document pipeline on the file paths it is given,
+so the input files must be reachable at the same path from every worker (e.g. a shared drive).
+Every supported file inside a zip archive becomes a job of its own.
+
+FUNCTIONS
+
+def create_coordinator_state
+def claim_job
+def complete_job
+def fail_job
+def is_finished
+def start_coordinator
+def wait_for_coordinator
+def send_request
+def send_request_with_retries
+def run_worker
+def run_local_cluster
+"""
+
+def create_coordinator_state(file_paths, selected_columns=None, summary_options=None):
+    """
+    Creates the object holding every job the coordinator hands out.
+    A zip archive is split into one job per supported file inside it, so its files are shared between workers too.
+    """
+    try:
+        sources = [] # (file path, archive member name or None, error) for each job
+
+        for file_path in file_paths:
+            file_path = os.path.abspath(file_path)
+
+            if get_file_extension(file_path) not in config.ARCHIVE_EXTENSIONS:
+                sources.append((file_path, None, None))
+                continue
+
+            member_names = list_archive_members(file_path)
+            if member_names:
+                sources += [(file_path, member_name, None) for member_name in member_names]
+            else:
+                sources.append((file_path, None, "The archive does not contain any supported files"))
+
+        jobs = {}
+
+        for job_number, (file_path, member_name, error) in enumerate(sources, start=1):
+            jobs[str(job_number)] = {
+                "job_id": str(job_number),
+                "source_file_path": file_path,
+                "member_name": member_name, # the file inside a zip archive, or None
+                "status": "failed" if error else "pending", # pending, running, saving, done or failed
+                "attempts": 0,
+                "claimed_at": None, # time each worker currently running the job claimed it
+                "results_file": None,
+                "worker_id": None, # worker that finished the job
+                "seconds": None,
+                "error": error
+            }
+
+        return {
+            "lock": threading.Lock(), # requests from different workers are handled on different threads
+            "jobs": jobs,
+            "selected_columns": selected_columns,
+            "summary_options": summary_options, # see create_summary_options
+            "finished": threading.Event() # set once every job is done or failed
+        }
+    except Exception as e:
+        traceback.print_exc()
+        messagebox.showerror("Error", f"An error occurred in create_coordinator_state: {e}")
+
+def claim_job(state, worker_id):
+    """
+    Returns the next job for a worker, or None if there is nothing for it to do right now.
+    """
+    with state["lock"]:
+        now = time.monotonic()
+        running_jobs = [job for job in state["jobs"].values() if job["status"] == "running"]
+
+        # jobs whose every lease has run out are put back, in case their workers have stopped
+        for job in running_jobs:
+            if all(now - claimed_at > config.DISTRIBUTED_LEASE_SECONDS for claimed_at in job["claimed_at"].values()):
+                job["status"] = "failed" if job["attempts"] >= config.DISTRIBUTED_MAX_ATTEMPTS else "pending"
+                job["error"] = "The worker running the job stopped responding"
+                job["claimed_at"] = None
+
+        chosen_job = next((job for job in state["jobs"].values() if job["status"] == "pending"), None)
+
+        if chosen_job is None:
+            # work stealing: the job that has been running longest is also given to this worker
+            stealable_jobs = [
+                job for job in state["jobs"].values()
+                if job["status"] == "running" and worker_id not in job["claimed_at"]
+                and now - min(job["claimed_at"].values()) > config.DISTRIBUTED_STEAL_SECONDS
+            ]
+            if stealable_jobs:
+                chosen_job = min(stealable_jobs, key=lambda job: min(job["claimed_at"].values()))
+
+        if chosen_job is None:
+            if all(job["status"] in ["done", "failed"] for job in state["jobs"].values()):
+                state["finished"].set()
+            return None
+
+        if chosen_job["status"] == "pending":
+            chosen_job["status"] = "running"
+            chosen_job["attempts"] += 1
+            chosen_job["claimed_at"] = {}
+        chosen_job["claimed_at"][worker_id] = now
+
+        return {
+            "job_id": chosen_job["job_id"],
+            "source_file_path": chosen_job["source_file_path"],
+            "member_name": chosen_job["member_name"],
+            "selected_columns": state["selected_columns"],
+            "summary_options": state["summary_options"]
+        }
+
+def complete_job(state, job_id, worker_id, records, seconds, attrs=None, columns=None):
+    """
+    Saves the results a worker sent back. If the job was also given to another worker,
+    only the first results to arrive are kept. If the results can't be saved, the job is retried.
+    """
+    with state["lock"]:
+        job = state["jobs"][job_id]
+        if job["status"] != "running":
+            return
+
+        job["status"] = "saving" # stops a second copy of the results being saved while this one is written
+        job["worker_id"] = worker_id
+        job["seconds"] = seconds
+        job["claimed_at"] = None
+
+    results_df = pd.DataFrame(records, columns=columns) # columns keeps the headings when no genes matched
+    results_df.attrs.update(attrs or {})
+    source_name = job["member_name"] or job["source_file_path"]
+    data_extension, compression_extension = get_source_extensions(source_name)
+    results_file_name = reserve_unique_file_name(f'{get_source_stem(source_name)}_results{data_extension}', config.RESULTS_FOLDER)
+    results_file = save_file(results_df, results_file_name, config.RESULTS_FOLDER, os.path.basename(source_name))
+
+    with state["lock"]:
+        if results_file is None: # the error has already been printed, and the job is run again
+            remove_file(os.path.join(config.RESULTS_FOLDER, results_file_name)) # the empty file reserve_unique_file_name created
+            job["status"] = "failed" if job["attempts"] >= config.DISTRIBUTED_MAX_ATTEMPTS else "pending"
+            job["error"] = "The results could not be saved"
+        else:
+            job["results_file"] = results_file
+            job["status"] = "done"
+
+        if all(job["status"] in ["done", "failed"] for job in state["jobs"].values()):
+            state["finished"].set()
+
+def fail_job(state, job_id, worker_id, error):
+    """
+    Records that a worker could not process a job. The job is retried until it has been
+    attempted DISTRIBUTED_MAX_ATTEMPTS times.
+    """
+    with state["lock"]:
+        job = state["jobs"][job_id]
+        if job["status"] != "running":
+            return
+
+        job["claimed_at"].pop(worker_id, None)
+        job["error"] = error
+
+        if job["claimed_at"]:
+            return # another worker is still running the job
+
+        job["claimed_at"] = None
+        job["status"] = "failed" if job["attempts"] >= config.DISTRIBUTED_MAX_ATTEMPTS else "pending"
+
+        if all(job["status"] in ["done", "failed"] for job in state["jobs"].values()):
+            state["finished"].set()
+
+def is_finished(state):
+    """
+    Returns True once every job is done or has failed too many times.
+    """
+    return state["finished"].is_set()
+
+class CoordinatorRequestHandler(BaseHTTPRequestHandler):
+    """
+    Answers the workers' HTTP requests. The request body and the response are JSON.
+    Requests without the coordinator's token are refused.
+    """
+
+    def do_POST(self):
+        try:
+            request_token = self.headers.get("X-Gene-Matcher-Token", "")
+            if not hmac.compare_digest(request_token.encode(), self.server.coordinator_token.encode()): # compare_digest takes the same time however much of the token matches
+                self.send_error(403)
+                return
+
+            state = self.server.coordinator_state
+            content_length = int(self.headers.get("Content-Length", 0))
+            request = json.loads(self.rfile.read(content_length) or b"{}")
+
+            if self.path == "/claim":
+                job = claim_job(state, request["worker_id"])
+                response = {"job": job, "finished": is_finished(state)}
+            elif self.path == "/complete":
+                complete_job(state, request["job_id"], request["worker_id"], request["records"], request.get("seconds"), request.get("attrs"), request.get("columns"))
+                response = {}
+            elif self.path == "/fail":
+                fail_job(state, request["job_id"], request["worker_id"], request.get("error"))
+                response = {}
+            else:
+                self.send_error(404)
+                return
+
+            response_body = json.dumps(response).encode()
+            self.send_response(200)
+            self.send_header("Content-Type", "application/json")
+            self.send_header("Content-Length", str(len(response_body)))
+            self.end_headers()
+            self.wfile.write(response_body)
+        except Exception as e:
+            traceback.print_exc()
+            self.send_error(500, str(e))
+
+    def log_message(self, format, *args):
+        pass # stops every request being printed to the console
+
+def start_coordinator(file_paths, port=config.DISTRIBUTED_PORT, selected_columns=None, host=config.DISTRIBUTED_HOST, summary_options=None, token=None):
+    """
+    Starts the coordinator on a background thread and returns (server, state).
+    Passing port 0 lets the operating system choose a free port, which can be read from server.server_port.
+    By default only this machine can connect. If no token is given, a random one is created and printed.
+    """
+    try:
+        state = create_coordinator_state(file_paths, selected_columns, summary_options)
+        server = ThreadingHTTPServer((host, port), CoordinatorRequestHandler)
+        server.coordinator_state = state # lets the request handler reach the jobs
+
+        if not token:
+            token = secrets.token_urlsafe(16)
+            print(f"Workers must be started with --token {token} (or the {config.DISTRIBUTED_TOKEN_VARIABLE} environment variable)")
+        server.coordinator_token = token
+
+        if all(job["status"] == "failed" for job in state["jobs"].values()): # also true when there are no jobs
+            state["finished"].set()
+
+        server_thread = threading.Thread(target=server.serve_forever, daemon=True)
+        server_thread.start()
+        print(f"Coordinator listening on {host}:{server.server_port} with {len(state['jobs'])} jobs")
+
+        return server, state
+    except Exception as e:
+        traceback.print_exc()
+        messagebox.showerror("Error", f"An error occurred in start_coordinator: {e}")
+
+def wait_for_coordinator(server, state):
+    """
+    Waits until every job is done or has failed, stops the coordinator and returns the jobs.
+    """
+    try:
+        state["finished"].wait()
+
+        time.sleep(config.DISTRIBUTED_POLL_SECONDS * 2) # gives idle workers time to hear that there is no more work
+        server.shutdown()
+        server.server_close()
+
+        for job in state["jobs"].values():
+            source_name = job["source_file_path"] if job["member_name"] is None else f"{job['source_file_path']}:{job['member_name']}"
+            print(f"{job['status']:>7}  {source_name}  ->  {job['results_file'] or job['error']}")
+
+        return list(state["jobs"].values())
+    except Exception as e:
+        traceback.print_exc()
+        messagebox.showerror("Error", f"An error occurred in wait_for_coordinator: {e}")
+
+def send_request(coordinator_url, path, payload, token):
+    """
+    Sends a JSON request to the coordinator and returns its JSON response.
+    """
+    request = urllib.request.Request(
+        coordinator_url.rstrip("/") + path,
+        data=json.dumps(payload, default=str).encode(), # default=str converts any value json can't (e.g. numpy numbers)
+        headers={"Content-Type": "application/json", "X-Gene-Matcher-Token": token},
+        method="POST"
+    )
+
+    with urllib.request.urlopen(request, timeout=60) as response:
+        return json.loads(response.read())
+
+def send_request_with_retries(coordinator_url, path, payload, token):
+    """
+    Sends a request to the coordinator, retrying with an increasing wait if it can't be reached
+    or returns an error. The coordinator ignores repeated results, so retrying is safe.
+    Raises the last error if every attempt fails.
+    """
+    for attempt in range(config.DISTRIBUTED_REQUEST_ATTEMPTS):
+        try:
+            return send_request(coordinator_url, path, payload, token)
+        except (urllib.error.URLError, ConnectionError, TimeoutError) as e: # HTTPError, e.g. a 500 response, is a URLError
+            if attempt == config.DISTRIBUTED_REQUEST_ATTEMPTS - 1:
+                raise
+            print(f"Request to {path} failed ({e}), retrying")
+            time.sleep(config.DISTRIBUTED_RETRY_SECONDS * 2 ** attempt)
+
+def run_worker(coordinator_url, worker_id=None, token=None):
+    """
+    Asks the coordinator for jobs until it says every job is finished.
+    token is the coordinator's token, read from the DISTRIBUTED_TOKEN_VARIABLE environment variable if it isn't given.
+    Each job is processed with generate_document, or generate_document_from_archive_member
+    for a file inside a zip archive, and the results are sent back as JSON.
+    Every job is recorded in the run history, which setup_run_history must have been called to create.
+    """
+    try:
+        worker_id = worker_id or f"{socket.gethostname()}-{os.getpid()}-{uuid.uuid4().hex[:6]}"
+        token = token or os.environ.get(config.DISTRIBUTED_TOKEN_VARIABLE)
+        if not token:
+            raise ValueError(f"The coordinator's token must be given with --token or the {config.DISTRIBUTED_TOKEN_VARIABLE} environment variable")
+        print(f"Worker {worker_id} connected to {coordinator_url}")
+
+        while True:
+            try:
+                response = send_request(coordinator_url, "/claim", {"worker_id": worker_id}, token)
+            except urllib.error.HTTPError as e:
+                print("The coordinator refused the token" if e.code == 403 else f"The coordinator returned an error: {e}")
+                return
+            except (urllib.error.URLError, ConnectionError):
+                print("The coordinator has stopped")
+                return
+
+            job = response["job"]
+
+            if job is None:
+                if response["finished"]:
+                    return
+                time.sleep(config.DISTRIBUTED_POLL_SECONDS)
+                continue
+
+            start_time = time.perf_counter()
+            run_stats = create_run_stats()
+            if job["member_name"] is None:
+                results_df = generate_document(job["source_file_path"], run_stats, job["selected_columns"], job["summary_options"])
+                input_bytes = os.path.getsize(job["source_file_path"])
+            else:
+                results_df = generate_document_from_archive_member(job["source_file_path"], job["member_name"], run_stats, job["selected_columns"], job["summary_options"])
+                with zipfile.ZipFile(job["source_file_path"]) as archive:
+                    input_bytes = archive.getinfo(job["member_name"]).file_size
+
+            source_name = os.path.basename(job["member_name"] or job["source_file_path"])
+            record_run(source_name, input_bytes, run_stats, time.perf_counter() - start_time, results_df is not None) # recorded in the run history of the machine the worker runs on
+
+            try:
+                if results_df is None: # the error has already been printed
+                    send_request_with_retries(coordinator_url, "/fail", {"worker_id": worker_id, "job_id": job["job_id"], "error": "The file could not be processed"}, token)
+                else:
+                    send_request_with_retries(coordinator_url, "/complete", {
+                        "worker_id": worker_id,
+                        "job_id": job["job_id"],
+                        "records": results_df.to_dict(orient="records"),
+                        "columns": list(results_df.columns),
+                        "attrs": results_df.attrs, # e.g. the sets genes-only results were matched on
+                        "seconds": time.perf_counter() - start_time
+                    }, token)
+            except (urllib.error.URLError, ConnectionError, TimeoutError) as e:
+                print(f"Could not send the result of job {job['job_id']} to the coordinator ({e}). It will be given to another worker once its lease runs out")
+    except Exception as e:
+        traceback.print_exc()
+        messagebox.showerror("Error", f"An error occurred in run_worker: {e}")
+
+def run_local_cluster(file_paths, worker_count=config.MAX_WORKERS, selected_columns=None, summary_options=None):
+    """
+    Runs a coordinator and worker_count worker processes on this machine, and returns the jobs once they are all finished.
+    Useful for testing, and for using every core of one machine.
+    """
+    try:
+        token = secrets.token_urlsafe(16)
+        server, state = start_coordinator(file_paths, port=0, selected_columns=selected_columns, host="127.0.0.1", summary_options=summary_options, token=token)
+        coordinator_url = f"http://127.0.0.1:{server.server_port}"
+        main_file = os.path.join(os.path.dirname(os.path.abspath(config.__file__)), "main.py")
+        worker_environment = dict(os.environ, **{config.DISTRIBUTED_TOKEN_VARIABLE: token}) # passed in the environment rather than the command line, where other users could see it
+
+        workers = [
+            subprocess.Popen([sys.executable, main_file, "--worker", coordinator_url], env=worker_environment)
+            for worker_number in range(worker_count)
+        ]
+
+        jobs = wait_for_coordinator(server, state)
+
+        for worker in workers:
+            worker.wait()
+
+        return jobs
+    except Exception as e:
+        traceback.print_exc()
+        messagebox.showerror("Error", f"An error occurred in run_local_cluster: {e}")
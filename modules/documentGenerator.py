@@ -9,7 +9,17 @@ import pandas as pd
 import traceback
 from tkinter import messagebox
 import copy
-from .fileHandler import get_file_extension
+import zipfile
+import time
+from concurrent.futures import ThreadPoolExecutor
+from .fileHandler import get_file_extension, get_source_extensions, open_source_stream, decompress_stream, list_archive_members
+from .userDataHandler import add_stage_time, add_to_run_stats
+from .inputCache import get_file_cache_key, get_archive_member_cache_key, read_snapshot, write_snapshot
+
+# Files inside zip archives are read by this one shared pool, so however many archives are being
+# processed at the same time, at most MAX_WORKERS members are read at once. These are threads, so
+# they mostly overlap file reading and decompression; the pandas parsing itself still holds the GIL
+archive_member_executor = ThreadPoolExecutor(max_workers=config.MAX_WORKERS)
 
 """
 FUNCTIONS
@@ -23,26 +33,41 @@ def initialize_matching_strings_positions
 def find_positions
 def populate_positions
 def convert_to_dataframe
+def create_summary_options
+def count_occurrences
+def filter_matching_strings
+def create_count_rows
+def read_source_stream
+def normalize_text_columns
+def read_source_headers
+def analyse_dataframe
 def generate_document
+def generate_document_from_archive_member
+def generate_documents
 """
 
-def rename_columns(dataframe):
+def rename_columns(dataframe, selected_columns=None):
     """
-    Renames the first two columns of the dataframe to 'Set 1' and 'Set 2'.
+    Renames the columns being matched to 'Set 1', 'Set 2', 'Set 3' etc.
+    If no columns have been selected, the first two columns of the dataframe are used.
     """
     try:
         column_names = dataframe.columns
         column_list = list(column_names)  # Convert to a list
         column_count = len(column_list)  # Get the number of columns
 
-        if column_count < 2:
-            messagebox.showwarning("Insufficient Columns", "The spreadsheet must contain at least two columns of data.")
-            raise ValueError("The dataframe must contain at least two columns.") #Will trigger the exception block. Value error is used when the argument is the right data type, but has the wrong value
+        if selected_columns is None:
+            if column_count < 2:
+                messagebox.showwarning("Insufficient Columns", "The spreadsheet must contain at least two columns of data.")
+                raise ValueError("The dataframe must contain at least two columns.") #Will trigger the exception block. Value error is used when the argument is the right data type, but has the wrong value
 
-        first_column = column_list[0]
-        second_column = column_list[1]
+            selected_columns = column_list[:2]
+        elif len(selected_columns) < 2:
+            messagebox.showwarning("Insufficient Columns", "Please choose at least two columns to match.")
+            raise ValueError("At least two columns must be selected.")
 
-        rename_dict = {first_column: "Set 1", second_column: "Set 2"}
+        dataframe = dataframe[list(selected_columns)] # puts the columns in the order they were selected in
+        rename_dict = {column: f"Set {set_number}" for set_number, column in enumerate(selected_columns, start=1)}
         dataframe = dataframe.rename(columns=rename_dict)
 
         return dataframe
@@ -129,19 +154,17 @@ def find_matching_strings(column_1_strings, column_2_strings):
         messagebox.showerror("Error", error_message)
 
 
-def initialize_matching_strings_positions(matching_strings):
+def initialize_matching_strings_positions(matching_strings, set_count=2):
     """
-    Creates an array of objects to store matching strings and their positions in both columns.
+    Creates an array of objects to store matching strings and their positions in every column.
     """
     try:
         result = []
 
         for string in matching_strings:
-            matching_string_info = {
-                "Gene": string,
-                "Column 1": [],
-                "Column 2": []
-            }
+            matching_string_info = {"Gene": string}
+            for set_number in range(1, set_count + 1):
+                matching_string_info[f"Column {set_number}"] = []
             
             result.append(matching_string_info)
         
@@ -177,13 +200,15 @@ def find_positions(dataframe, column_name, matching_string):
 
 def populate_positions(dataframe, matching_strings_positions_empty):
     """
-    Populates the positions of matching strings in both columns.
+    Populates the positions of matching strings in every column.
     """
     try:
         matching_strings_positions_copy = copy.deepcopy(matching_strings_positions_empty) #Stops matching_strings_positions_empty from being altered
         for obj in matching_strings_positions_copy:
-            obj["Column 1"] = find_positions(dataframe, "Set 1", obj["Gene"])
-            obj["Column 2"] = find_positions(dataframe, "Set 2", obj["Gene"])
+            for column_key in obj:
+                if column_key.startswith("Column "):
+                    set_number = column_key.split(" ")[1]
+                    obj[column_key] = find_positions(dataframe, f"Set {set_number}", obj["Gene"])
 
         return matching_strings_positions_copy
     except Exception as e:
@@ -191,43 +216,216 @@ def populate_positions(dataframe, matching_strings_positions_empty):
         error_message = f"Error in populate_positions: {e}"
         messagebox.showerror("Error", error_message)
 
-def convert_to_dataframe(matching_strings_positions):
+def convert_to_dataframe(matching_strings_positions, set_count=2):
     """
     Converts matching_strings_positions into a DataFrame.
+    The columns are always 'Gene', 'Column 1' ... 'Column N', even when no strings match.
     """
     try:
-        dataframe = pd.DataFrame(matching_strings_positions)
+        columns = ["Gene"] + [f"Column {set_number}" for set_number in range(1, set_count + 1)]
+        dataframe = pd.DataFrame(matching_strings_positions, columns=columns)
         return dataframe
     except Exception as e:
         traceback.print_exc()
         error_message = f"Error in convert_to_dataframe: {e}"
         messagebox.showerror("Error", error_message)
 
-def generate_document(source_file_path):
+def create_summary_options(output_mode="positions", min_occurrences=None, top_k=None):
     """
-    Processes the input file to identify matching strings and returns a DataFrame
-    containing matching strings and their positions.
+    Creates the object describing what the results report:
+
+        - output_mode: 'positions' lists every row each gene is on, 'genes-only' just the genes
+          found in every column, and 'counts' how many times each gene appears in each column
+        - min_occurrences: only genes appearing at least this many times in total are reported
+        - top_k: only this many genes are reported, those appearing the most times first
+    """
+    if output_mode not in config.OUTPUT_MODES:
+        raise ValueError(f"Unknown output mode '{output_mode}'")
+    if (min_occurrences or 0) < 0 or (top_k or 0) < 0:
+        raise ValueError("min_occurrences and top_k can't be negative")
+
+    return {
+        "output_mode": output_mode,
+        "min_occurrences": min_occurrences or None, # 0 means no filter
+        "top_k": top_k or None
+    }
+
+def count_occurrences(dataframe, column_name):
+    """
+    Returns a dictionary of value: number of times it appears in a column.
+    The values are compared as strings, as they are in find_positions, but the column is only read once.
     """
     try:
-        print('=================================================')
-        debug = False
-        file_extension = get_file_extension(source_file_path)
+        return dataframe[column_name].astype(str).value_counts().to_dict()
+    except Exception as e:
+        traceback.print_exc()
+        error_message = f"Error in count_occurrences: {e}"
+        messagebox.showerror("Error", error_message)
+
+def filter_matching_strings(matching_strings, occurrence_counts, min_occurrences=None, top_k=None):
+    """
+    Keeps only the matching strings that will be reported, so positions are never collected for the rest.
+    occurrence_counts holds the result of count_occurrences for every column.
+    With top_k, the strings appearing the most times come first; ties keep their original order.
+    """
+    try:
+        total_counts = {string: sum(counts.get(string, 0) for counts in occurrence_counts) for string in matching_strings}
+
+        if min_occurrences:
+            matching_strings = [string for string in matching_strings if total_counts[string] >= min_occurrences]
+        if top_k:
+            matching_strings = sorted(matching_strings, key=lambda string: total_counts[string], reverse=True)[:top_k] # sorted is stable, so ties keep their order
+
+        return matching_strings
+    except Exception as e:
+        traceback.print_exc()
+        error_message = f"Error in filter_matching_strings: {e}"
+        messagebox.showerror("Error", error_message)
+
+def create_count_rows(matching_strings, occurrence_counts):
+    """
+    Creates a row for every matching string with the number of times it appears in each column and in total.
+    """
+    try:
+        rows = []
+
+        for string in matching_strings:
+            row = {"Gene": string}
+            for set_number, counts in enumerate(occurrence_counts, start=1):
+                row[f"Count {set_number}"] = counts.get(string, 0)
+            row["Total"] = sum(counts.get(string, 0) for counts in occurrence_counts)
+            rows.append(row)
 
-        if file_extension in [".xls", ".xlsx"]:
-            df_to_analyse = pd.read_excel(source_file_path)
-        elif file_extension == ".ods":
-            df_to_analyse = pd.read_excel(source_file_path, engine="odf")
+        return rows
+    except Exception as e:
+        traceback.print_exc()
+        error_message = f"Error in create_count_rows: {e}"
+        messagebox.showerror("Error", error_message)
+
+def read_source_stream(source_stream, data_extension, selected_columns=None, nrows=None):
+    """
+    Reads an open binary stream into a DataFrame using the reader that matches the data extension.
+
+        - selected_columns: only these columns are kept, which saves memory and parse time
+        - nrows: only this many rows are read after the header row
+    """
+    try:
+        usecols = list(selected_columns) if selected_columns is not None else None
+
+        if data_extension in [".xls", ".xlsx"]:
+            dataframe = pd.read_excel(source_stream, usecols=usecols, nrows=nrows)
+        elif data_extension == ".ods":
+            dataframe = pd.read_excel(source_stream, engine="odf", usecols=usecols, nrows=nrows)
+        elif data_extension == ".csv":
+            dataframe = pd.read_csv(source_stream, usecols=usecols, nrows=nrows)
+        elif data_extension in [".tsv", ".txt"]:
+            dataframe = pd.read_csv(source_stream, sep="\t", usecols=usecols, nrows=nrows)
         else:
             raise ValueError("Unsupported file format")
 
-        df_to_analyse = rename_columns(df_to_analyse)
+        return dataframe
+    except Exception as e:
+        traceback.print_exc()
+        error_message = f"Error in read_source_stream: {e}"
+        messagebox.showerror("Error", error_message)
+
+def normalize_text_columns(dataframe):
+    """
+    Converts every filled cell in the non-numeric columns to a string using format_cell,
+    so the columns can be saved to the parsed input cache and read back unchanged.
+    Every non-numeric column becomes a plain object column, including dates, which would
+    otherwise keep their datetime type and be converted to strings differently by the cache.
+    """
+    try:
+        for column in dataframe.columns:
+            if not pd.api.types.is_numeric_dtype(dataframe[column]):
+                values = dataframe[column].astype(object)
+                filled = values.notna()
+                values[filled] = values[filled].map(format_cell) # empty cells are left empty
+                dataframe[column] = values
+        return dataframe
+    except Exception as e:
+        traceback.print_exc()
+        error_message = f"An error occurred in normalize_text_columns: {e}"
+        messagebox.showerror("Error", error_message)
+
+def read_source_headers(source_file_path, preview_rows=5):
+    """
+    Returns the column names of an input file by reading only its first few rows,
+    so the user can choose which columns to match without waiting for the whole file.
+    For a zip archive, the headers of the first supported file inside it are returned.
+    The .xls and .ods readers load the whole workbook before the rows are limited, so for those
+    files this can take as long as reading the file, and the GUI calls it on a separate thread.
+    """
+    try:
+        file_extension = get_file_extension(source_file_path)
+
+        if file_extension in config.ARCHIVE_EXTENSIONS:
+            member_names = list_archive_members(source_file_path)
+
+            if not member_names:
+                raise ValueError("The archive does not contain any supported files")
+
+            data_extension, compression_extension = get_source_extensions(member_names[0])
+            with zipfile.ZipFile(source_file_path) as archive:
+                with archive.open(member_names[0]) as member_stream:
+                    with decompress_stream(member_stream, compression_extension) as source_stream:
+                        preview_df = read_source_stream(source_stream, data_extension, nrows=preview_rows)
+        else:
+            data_extension, compression_extension = get_source_extensions(source_file_path)
+            with open_source_stream(source_file_path) as source_stream:
+                preview_df = read_source_stream(source_stream, data_extension, nrows=preview_rows)
+
+        return list(preview_df.columns)
+    except Exception as e:
+        traceback.print_exc()
+        error_message = f"Error in read_source_headers: {e}"
+        messagebox.showerror("Error", error_message)
+
+def analyse_dataframe(df_to_analyse, run_stats=None, selected_columns=None, summary_options=None):
+    """
+    Identifies the strings that appear in every selected column of a DataFrame that has
+    already been read, and returns a DataFrame containing matching strings and their positions.
+    If no columns are selected, the first two columns are matched.
+    The number of rows, matches and the time taken are added to run_stats if it is given.
+    summary_options (see create_summary_options) can report only the genes or their counts,
+    and filter the genes before their positions are collected.
+    """
+    try:
+        debug = False
+        match_start_time = time.perf_counter()
+
+        df_to_analyse = rename_columns(df_to_analyse, selected_columns)
         df_to_analyse = clean_dataframe_to_integers(df_to_analyse)
+        set_count = len(df_to_analyse.columns)
         column1_strings = read_and_clean_column(df_to_analyse, "Set 1")
         column2_strings = read_and_clean_column(df_to_analyse, "Set 2")
         matching_strings = find_matching_strings(column1_strings, column2_strings)
-        matching_strings_positions_empty = initialize_matching_strings_positions(matching_strings)
-        matching_strings_positions_populated = populate_positions(df_to_analyse, matching_strings_positions_empty)
-        matching_strings_df = convert_to_dataframe(matching_strings_positions_populated)
+        for set_number in range(3, set_count + 1): # any further columns narrow the matches down to strings found in every column
+            matching_strings = find_matching_strings(matching_strings, read_and_clean_column(df_to_analyse, f"Set {set_number}"))
+
+        summary_options = summary_options or create_summary_options()
+        output_mode = summary_options["output_mode"]
+        matching_strings_positions_empty = None
+        matching_strings_positions_populated = None
+
+        if output_mode == "counts" or summary_options["min_occurrences"] or summary_options["top_k"]:
+            occurrence_counts = [count_occurrences(df_to_analyse, f"Set {set_number}") for set_number in range(1, set_count + 1)] # one pass over each column, instead of one per gene
+            matching_strings = filter_matching_strings(matching_strings, occurrence_counts, summary_options["min_occurrences"], summary_options["top_k"])
+
+        if output_mode == "genes-only":
+            matching_strings_df = pd.DataFrame({"Gene": matching_strings})
+            matching_strings_df.attrs["set_columns"] = [f"Column {set_number}" for set_number in range(1, set_count + 1)] # lets the results record which sets every gene was found in
+        elif output_mode == "counts":
+            matching_strings_df = pd.DataFrame(create_count_rows(matching_strings, occurrence_counts), columns=["Gene"] + [f"Count {set_number}" for set_number in range(1, set_count + 1)] + ["Total"])
+        else:
+            matching_strings_positions_empty = initialize_matching_strings_positions(matching_strings, set_count)
+            matching_strings_positions_populated = populate_positions(df_to_analyse, matching_strings_positions_empty) # positions are only collected for the genes that are reported
+            matching_strings_df = convert_to_dataframe(matching_strings_positions_populated, set_count)
+
+        add_stage_time(run_stats, "match", time.perf_counter() - match_start_time)
+        add_to_run_stats(run_stats, "input_rows", len(df_to_analyse))
+        add_to_run_stats(run_stats, "match_count", len(matching_strings_df))
 
         if debug:
             print('df_to_analyse\n', df_to_analyse, '\n')
@@ -242,7 +440,97 @@ def generate_document(source_file_path):
             print('\n Matching Genes:')
             print('\n', matching_strings_df)
         return matching_strings_df
+    except Exception as e:
+        traceback.print_exc()
+        error_message = f"Error in analyse_dataframe: {e}"
+        messagebox.showerror("Error", error_message)
+
+def generate_document(source_file_path, run_stats=None, selected_columns=None, summary_options=None):
+    """
+    Processes the input file to identify matching strings and returns a DataFrame
+    containing matching strings and their positions.
+    .gz and .bz2 files are decompressed as they are read rather than extracted to disk.
+    When columns are selected, only those columns are read from the file.
+    Files that have been read before are loaded from the parsed input cache instead.
+    """
+    try:
+        print('=================================================')
+        data_extension, compression_extension = get_source_extensions(source_file_path)
+
+        if data_extension not in config.SPREADSHEET_EXTENSIONS + config.TEXT_EXTENSIONS:
+            raise ValueError("Unsupported file format")
+
+        read_start_time = time.perf_counter()
+        cache_key = get_file_cache_key(source_file_path)
+        df_to_analyse = read_snapshot(cache_key, selected_columns)
+
+        if df_to_analyse is None:
+            with open_source_stream(source_file_path) as source_stream: # the stream is closed once the file has been read
+                df_to_analyse = read_source_stream(source_stream, data_extension, selected_columns)
+            df_to_analyse = normalize_text_columns(df_to_analyse)
+            write_snapshot(cache_key, df_to_analyse, selected_columns is None)
+        add_stage_time(run_stats, "read", time.perf_counter() - read_start_time)
+
+        return analyse_dataframe(df_to_analyse, run_stats, selected_columns, summary_options)
     except Exception as e:
         traceback.print_exc()
         error_message = f"Error in generate_document: {e}"
         messagebox.showerror("Error", error_message)
+
+def generate_document_from_archive_member(archive_path, member_name, run_stats=None, selected_columns=None, summary_options=None):
+    """
+    Processes a single file inside a zip archive without extracting it to disk.
+    Each call opens its own handle on the archive so members can be processed at the same time.
+    """
+    try:
+        print('=================================================')
+        data_extension, compression_extension = get_source_extensions(member_name)
+
+        read_start_time = time.perf_counter()
+        with zipfile.ZipFile(archive_path) as archive:
+            cache_key = get_archive_member_cache_key(archive_path, archive.getinfo(member_name))
+            df_to_analyse = read_snapshot(cache_key, selected_columns)
+
+            if df_to_analyse is None:
+                with archive.open(member_name) as member_stream:
+                    with decompress_stream(member_stream, compression_extension) as source_stream: # members can themselves be .gz or .bz2 files
+                        df_to_analyse = read_source_stream(source_stream, data_extension, selected_columns)
+                df_to_analyse = normalize_text_columns(df_to_analyse)
+                write_snapshot(cache_key, df_to_analyse, selected_columns is None)
+        add_stage_time(run_stats, "read", time.perf_counter() - read_start_time)
+
+        return analyse_dataframe(df_to_analyse, run_stats, selected_columns, summary_options)
+    except Exception as e:
+        traceback.print_exc()
+        error_message = f"Error in generate_document_from_archive_member: {e}"
+        messagebox.showerror("Error", error_message)
+
+def generate_documents(source_file_path, run_stats=None, selected_columns=None, summary_options=None):
+    """
+    Processes an input file and returns a list of (source name, DataFrame) pairs:
+
+        - A zip archive is treated as a batch, with the supported files inside it read on the shared archive_member_executor
+        - Any other input file returns a single pair
+
+    Stage timings of a batch are summed across every file in it, and the selected
+    columns and summary options are used for every file in it.
+    """
+    try:
+        file_extension = get_file_extension(source_file_path)
+
+        if file_extension not in config.ARCHIVE_EXTENSIONS:
+            source_name = os.path.basename(source_file_path)
+            return [(source_name, generate_document(source_file_path, run_stats, selected_columns, summary_options))]
+
+        member_names = list_archive_members(source_file_path)
+
+        if not member_names:
+            raise ValueError("The archive does not contain any supported files")
+
+        results = archive_member_executor.map(lambda member_name: generate_document_from_archive_member(source_file_path, member_name, run_stats, selected_columns, summary_options), member_names) # map returns the results in the same order as member_names
+
+        return list(zip(member_names, results))
+    except Exception as e:
+        traceback.print_exc()
+        error_message = f"Error in generate_documents: {e}"
+        messagebox.showerror("Error", error_message)
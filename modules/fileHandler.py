@@ -10,6 +10,10 @@ import shutil
 import traceback
 import sys
 import config
+import gzip
+import bz2
+import zipfile
+import sqlite3
 from tkinter import messagebox  
 import pandas as pd  
 """
@@ -18,9 +22,18 @@ FUNCTIONS
 def setup_file_structure
 def copy_file
 def save_file
+def save_results_to_sqlite
+def save_results_files
 def clear_files
 def truncate_filename
 def get_file_extension
+def get_source_extensions
+def open_source_stream
+def decompress_stream
+def list_archive_members
+def get_source_stem
+def reserve_unique_file_name
+def remove_file
 """
 
 def setup_file_structure():
@@ -32,11 +45,6 @@ def setup_file_structure():
         for folder in config.ALL_FOLDERS:
             os.makedirs(folder, exist_ok=True)
 
-        # Create the number_of_uses file if it doesn't exist
-        if not os.path.exists(config.NUMBER_OF_USES_FILE):
-            with open(config.NUMBER_OF_USES_FILE, "w") as f:
-                f.write("0")  # Initialize with zero uses
-
     except Exception as e:
         traceback.print_exc() 
         messagebox.showerror("Error", f"An error occurred in setup_file_structure: {e}") 
@@ -64,10 +72,11 @@ def copy_file(source_path, destination_folder):
         return None
 
 
-def save_file(dataframe, file_name, destination_folder):
+def save_file(dataframe, file_name, destination_folder, source_name=None):
     """
     Saves a pandas DataFrame to an Excel file in the specified destination folder:
      - If the folder does not exist, it is created.
+     - source_name is the input file the results came from, recorded in SQLite results.
      - Returns the file path of the saved file or None in case of an error.
     """
     try:
@@ -79,6 +88,13 @@ def save_file(dataframe, file_name, destination_folder):
             dataframe.to_excel(file_path, index=False)
         elif file_extension in [".ods"]:
             dataframe.to_excel(file_path, index=False, engine='odf')
+        elif file_extension in [".csv"]:
+            dataframe.to_csv(file_path, index=False)
+        elif file_extension in [".tsv", ".txt"]:
+            dataframe.to_csv(file_path, index=False, sep="\t")
+        elif file_extension in config.DATABASE_EXTENSIONS:
+            if save_results_to_sqlite([(source_name or file_name, dataframe)], file_path) is None: # the error has already been shown to the user
+                return None
 
         os.chmod(file_path, 0o666)  # Grant read & write permissions to the owner and others
         
@@ -90,7 +106,135 @@ def save_file(dataframe, file_name, destination_folder):
         messagebox.showerror("Error", error_message)
         return None
 
-    
+def save_results_to_sqlite(results, file_path):
+    """
+    Saves results to an SQLite database, so results too large for a spreadsheet can be queried:
+
+        - genes: one row per matching gene
+        - sets: one row per column of each input file ('Column 1', 'Column 2' etc.)
+        - positions: one row per place a gene appears in a set
+        - occurrences: the number of times a gene appears in a set, for results saved in the 'counts' output mode.
+          For 'genes-only' results the count is NULL, as only the sets each gene is in are known
+
+    All rows are inserted in a single transaction and the indexes are built afterwards,
+    which is much faster than updating the indexes on every insert.
+    results is a list of (source name, DataFrame) pairs.
+    """
+    try:
+        if os.path.exists(file_path) and os.path.getsize(file_path) > 0:
+            os.remove(file_path) # replaces an existing database, like saving a spreadsheet does. An empty file is the placeholder from reserve_unique_file_name, which is kept so the name stays reserved and SQLite writes into it
+
+        connection = sqlite3.connect(file_path)
+        connection.execute("PRAGMA journal_mode=OFF") # the database is new, so if saving fails it is simply saved again
+        connection.execute("PRAGMA synchronous=OFF")
+
+        connection.executescript("""
+            CREATE TABLE genes (gene_id INTEGER PRIMARY KEY, gene TEXT NOT NULL);
+            CREATE TABLE sets (set_id INTEGER PRIMARY KEY, source_name TEXT NOT NULL, column_name TEXT NOT NULL);
+            CREATE TABLE positions (gene_id INTEGER NOT NULL, set_id INTEGER NOT NULL, row_number INTEGER NOT NULL);
+            CREATE TABLE occurrences (gene_id INTEGER NOT NULL, set_id INTEGER NOT NULL, occurrence_count INTEGER);
+        """)
+
+        gene_ids = {} # gene: gene_id, so a gene found in several input files is stored once
+        set_rows = []
+        occurrence_rows = []
+
+        def generate_position_rows():
+            # rows are generated as they are inserted, so every position never has to be held in memory at once
+            for source_name, dataframe in results:
+                position_columns = [column for column in dataframe.columns if str(column).startswith("Column ")]
+                count_columns = [column for column in dataframe.columns if str(column).startswith("Count ")] # only in the 'counts' output mode
+                present_columns = [] # only in the 'genes-only' output mode, where every gene is in every set
+                if not position_columns and not count_columns:
+                    present_columns = dataframe.attrs.get("set_columns", [])
+
+                set_ids = {}
+                for column in position_columns + count_columns + present_columns:
+                    set_ids[column] = len(set_rows) + 1
+                    set_rows.append((set_ids[column], source_name, column))
+
+                if "Gene" not in dataframe.columns: # e.g. results with no matching genes that were saved without their columns
+                    continue
+
+                for gene, *column_values in zip(dataframe["Gene"], *[dataframe[column] for column in position_columns + count_columns]):
+                    gene_id = gene_ids.setdefault(str(gene), len(gene_ids) + 1)
+                    for column, positions in zip(position_columns, column_values):
+                        for row_number in positions:
+                            yield (gene_id, set_ids[column], int(row_number))
+                    for column, occurrence_count in zip(count_columns, column_values[len(position_columns):]):
+                        occurrence_rows.append((gene_id, set_ids[column], int(occurrence_count)))
+                    for column in present_columns:
+                        occurrence_rows.append((gene_id, set_ids[column], None))
+
+        with connection: # one transaction for every insert
+            connection.executemany("INSERT INTO positions VALUES (?, ?, ?)", generate_position_rows())
+            connection.executemany("INSERT INTO occurrences VALUES (?, ?, ?)", occurrence_rows)
+            connection.executemany("INSERT INTO genes VALUES (?, ?)", ((gene_id, gene) for gene, gene_id in gene_ids.items())) # gene_ids and set_rows are filled in while the positions are inserted
+            connection.executemany("INSERT INTO sets VALUES (?, ?, ?)", set_rows)
+
+        connection.executescript("""
+            CREATE UNIQUE INDEX genes_gene ON genes(gene);
+            CREATE INDEX positions_gene_set ON positions(gene_id, set_id);
+            CREATE INDEX positions_set ON positions(set_id);
+            CREATE INDEX occurrences_gene_set ON occurrences(gene_id, set_id);
+
+            -- every position with its gene and set, e.g. SELECT * FROM gene_positions WHERE gene = 'BRCA1'
+            CREATE VIEW gene_positions AS
+                SELECT genes.gene, sets.source_name, sets.column_name, positions.row_number
+                FROM positions
+                JOIN genes USING (gene_id)
+                JOIN sets USING (set_id);
+
+            -- the number of sets each gene appears in, e.g. SELECT gene FROM gene_set_counts WHERE set_count >= 3
+            -- positions and occurrences are both used, so it works whichever output mode the results were saved in
+            CREATE VIEW gene_set_counts AS
+                SELECT genes.gene, COUNT(DISTINCT gene_sets.set_id) AS set_count
+                FROM (
+                    SELECT gene_id, set_id FROM positions
+                    UNION ALL
+                    SELECT gene_id, set_id FROM occurrences
+                ) AS gene_sets
+                JOIN genes USING (gene_id)
+                GROUP BY gene_sets.gene_id;
+
+            ANALYZE;
+        """)
+        connection.close()
+
+        return file_path
+    except Exception as e:
+        traceback.print_exc()
+        error_message = f"An error occurred in save_results_to_sqlite: {e}"
+        messagebox.showerror("Error", error_message)
+        return None
+
+def save_results_files(results, results_extension=None, destination_folder=config.RESULTS_FOLDER):
+    """
+    Saves each (source name, DataFrame) pair of results to its own uniquely named file,
+    '<source>_results<extension>', so earlier results are never overwritten.
+    Results are saved in the same format as their source unless results_extension is given.
+    Returns (paths of the saved files, True if any results could not be saved).
+    """
+    saved_results_files = []
+    save_failed = False
+
+    for source_name, dataframe in results:
+        if dataframe is None: # the error has already been shown to the user
+            continue
+
+        data_extension, compression_extension = get_source_extensions(source_name)
+        results_file_name = reserve_unique_file_name(f'{get_source_stem(source_name)}_results{results_extension or data_extension}', destination_folder)
+        saved_results_file = save_file(dataframe, results_file_name, destination_folder, source_name) if results_file_name else None
+
+        if saved_results_file is None: # the error has already been shown to the user
+            save_failed = True
+            if results_file_name:
+                remove_file(os.path.join(destination_folder, results_file_name)) # the empty file reserve_unique_file_name created
+        else:
+            saved_results_files.append(saved_results_file)
+
+    return saved_results_files, save_failed
+
 def clear_files():
     """
     Clears all files in the specified folders.
@@ -141,4 +285,141 @@ def get_file_extension(file_path):
     except Exception as e:
         traceback.print_exc()
         error_message = f"Error in get_file_extension: {e}"
-        messagebox.showerror("Error", error_message)
\ No newline at end of file
+        messagebox.showerror("Error", error_message)
+
+def get_source_extensions(file_path):
+    """
+    Returns the data extension and the compression extension of an input file:
+
+        - 'genes.tsv.gz' returns ('.tsv', '.gz')
+        - 'genes.xlsx' returns ('.xlsx', None)
+    """
+    try:
+        file_extension = get_file_extension(file_path)
+
+        if file_extension in config.COMPRESSION_EXTENSIONS:
+            file_name_without_compression = os.path.splitext(file_path)[0] # removes the compression extension so the extension of the data underneath can be read
+            data_extension = get_file_extension(file_name_without_compression)
+            return data_extension, file_extension
+
+        return file_extension, None
+    except Exception as e:
+        traceback.print_exc()
+        error_message = f"Error in get_source_extensions: {e}"
+        messagebox.showerror("Error", error_message)
+
+def decompress_stream(raw_stream, compression_extension):
+    """
+    Wraps a binary stream so it is decompressed as it is read.
+    Nothing is extracted to disk. Streams with no compression are returned unchanged.
+    """
+    try:
+        if compression_extension == ".gz":
+            return gzip.GzipFile(fileobj=raw_stream, mode="rb")
+        elif compression_extension == ".bz2":
+            return bz2.BZ2File(raw_stream, mode="rb")
+
+        return raw_stream
+    except Exception as e:
+        traceback.print_exc()
+        error_message = f"Error in decompress_stream: {e}"
+        messagebox.showerror("Error", error_message)
+
+def open_source_stream(file_path):
+    """
+    Opens an input file as a binary stream, decompressing .gz and .bz2 files as they are read.
+    The caller is responsible for closing the stream.
+    """
+    try:
+        data_extension, compression_extension = get_source_extensions(file_path)
+
+        if compression_extension == ".gz":
+            return gzip.open(file_path, "rb")
+        elif compression_extension == ".bz2":
+            return bz2.open(file_path, "rb")
+
+        return open(file_path, "rb")
+    except Exception as e:
+        traceback.print_exc()
+        error_message = f"Error in open_source_stream: {e}"
+        messagebox.showerror("Error", error_message)
+
+def list_archive_members(archive_path):
+    """
+    Returns the names of the files inside a zip archive that can be used as input files.
+    Folders and files added by the operating system (e.g. __MACOSX) are skipped.
+    """
+    try:
+        supported_extensions = config.SPREADSHEET_EXTENSIONS + config.TEXT_EXTENSIONS
+        member_names = []
+
+        with zipfile.ZipFile(archive_path) as archive:
+            for member in archive.infolist():
+                if member.is_dir() or member.filename.startswith("__MACOSX/"):
+                    continue
+
+                data_extension, compression_extension = get_source_extensions(member.filename)
+
+                if data_extension in supported_extensions:
+                    member_names.append(member.filename)
+
+        return member_names
+    except Exception as e:
+        traceback.print_exc()
+        error_message = f"Error in list_archive_members: {e}"
+        messagebox.showerror("Error", error_message)
+
+def get_source_stem(file_path):
+    """
+    Returns the file name without its folder, data extension or compression extension:
+    '/data/genes.tsv.gz' returns 'genes'.
+    """
+    try:
+        file_name = os.path.basename(file_path)
+        data_extension, compression_extension = get_source_extensions(file_name)
+
+        if compression_extension:
+            file_name = os.path.splitext(file_name)[0]
+
+        return os.path.splitext(file_name)[0]
+    except Exception as e:
+        traceback.print_exc()
+        error_message = f"Error in get_source_stem: {e}"
+        messagebox.showerror("Error", error_message)
+
+def reserve_unique_file_name(file_name, destination_folder):
+    """
+    Returns a file name that is not already used in the destination folder,
+    adding _2, _3 etc. before the extension when needed.
+    An empty file is created straight away to reserve the name, so jobs running
+    at the same time (even in other processes) can never be given the same name.
+    """
+    try:
+        os.makedirs(destination_folder, exist_ok=True)
+        stem, file_extension = os.path.splitext(file_name)
+        candidate_name = file_name
+        copy_number = 1
+
+        while True:
+            try:
+                file_descriptor = os.open(os.path.join(destination_folder, candidate_name), os.O_CREAT | os.O_EXCL | os.O_WRONLY) # fails if the file already exists, so checking and creating happen in one step
+                os.close(file_descriptor)
+                return candidate_name
+            except FileExistsError:
+                copy_number += 1
+                candidate_name = f"{stem}_{copy_number}{file_extension}"
+    except Exception as e:
+        traceback.print_exc()
+        error_message = f"Error in reserve_unique_file_name: {e}"
+        messagebox.showerror("Error", error_message)
+
+def remove_file(file_path):
+    """
+    Deletes a file if it exists, e.g. the empty file reserve_unique_file_name created for results that could not be saved.
+    """
+    try:
+        os.remove(file_path)
+    except FileNotFoundError:
+        pass
+    except Exception as e:
+        traceback.print_exc()
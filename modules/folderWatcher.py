@@ -0,0 +1,258 @@
+"""
+This file is part of Gene Matcher.
+Licensed under the Creative Commons Attribution-NonCommercial 4.0 International License.
+See LICENSE file for details: https://creativecommons.org/licenses/by-nc/4.0/
+"""
+import config
+import os
+import json
+import threading
+import time
+import traceback
+from concurrent.futures import ThreadPoolExecutor
+from tkinter import messagebox
+from .fileHandler import get_file_extension, get_source_extensions, save_results_files
+from .documentGenerator import generate_documents
+from .userDataHandler import create_run_stats, add_stage_time, record_run
+
+"""
+FUNCTIONS
+
+def is_watchable_file
+def get_file_signature
+def can_open_file
+def scan_folder
+def read_processed_files
+def mark_file_processed
+def watch_folder
+def start_watching
+def stop_watching
+def process_watched_file
+def run_headless_watch
+"""
+
+# Global variables
+watcher_thread = None
+stop_watching_event = threading.Event()
+processed_files_lock = threading.Lock() # files can finish processing on several worker threads at the same time
+
+def is_watchable_file(file_name):
+    """
+    Returns True if a file in the watched folder is an input file that can be processed.
+    Hidden files and the lock files spreadsheet programs create while a file is open (~$genes.xlsx) are skipped.
+    """
+    try:
+        if file_name.startswith(".") or file_name.startswith("~$"):
+            return False
+
+        supported_extensions = config.SPREADSHEET_EXTENSIONS + config.TEXT_EXTENSIONS + config.ARCHIVE_EXTENSIONS
+        file_extension = get_file_extension(file_name)
+        data_extension, compression_extension = get_source_extensions(file_name)
+
+        return file_extension in supported_extensions or data_extension in supported_extensions
+    except Exception as e:
+        traceback.print_exc()
+        error_message = f"Error in is_watchable_file: {e}"
+        messagebox.showerror("Error", error_message)
+
+def get_file_signature(directory_entry):
+    """
+    Returns the size and modification time of a file. The signature changes whenever the file is written to.
+    """
+    file_stats = directory_entry.stat()
+    return (file_stats.st_size, file_stats.st_mtime_ns)
+
+def can_open_file(file_path):
+    """
+    Returns True if the file can be opened for reading.
+    On Windows, a file that another program is still writing cannot be opened.
+    """
+    try:
+        with open(file_path, "rb"):
+            return True
+    except OSError:
+        return False
+
+def scan_folder(folder):
+    """
+    Returns the signature of every watchable file in the folder, keyed by file path.
+    """
+    try:
+        signatures = {}
+
+        with os.scandir(folder) as directory_entries: # scandir gets the file sizes and times in the same call as the file names
+            for directory_entry in directory_entries:
+                if directory_entry.is_file() and is_watchable_file(directory_entry.name):
+                    signatures[directory_entry.path] = get_file_signature(directory_entry)
+
+        return signatures
+    except FileNotFoundError:
+        return {} # the folder may have been removed while it was being watched
+    except Exception as e:
+        traceback.print_exc()
+        return {}
+
+def read_processed_files():
+    """
+    Returns the signature of the version of each watched file that was last processed, keyed by absolute file path.
+    """
+    try:
+        with open(config.PROCESSED_FILES_FILE, "r") as file:
+            return {file_path: tuple(signature) for file_path, signature in json.load(file).items()}
+    except (FileNotFoundError, ValueError):
+        return {}
+
+def mark_file_processed(file_path):
+    """
+    Records that a watched file has been processed successfully, so it isn't processed again
+    the next time watching starts, unless it has changed since.
+    """
+    try:
+        file_stats = os.stat(file_path)
+
+        with processed_files_lock:
+            processed_files = read_processed_files()
+            processed_files[os.path.abspath(file_path)] = (file_stats.st_size, file_stats.st_mtime_ns)
+
+            temporary_path = config.PROCESSED_FILES_FILE + ".tmp"
+            with open(temporary_path, "w") as file:
+                json.dump(processed_files, file)
+            os.replace(temporary_path, config.PROCESSED_FILES_FILE) # the file is replaced whole, so it is never left half written
+    except Exception as e:
+        traceback.print_exc() # the file is just processed again next time
+
+def watch_folder(folder, on_file_ready):
+    """
+    Runs on the watcher thread. Checks the folder every WATCH_POLL_SECONDS and calls
+    on_file_ready(file_path) for each new or modified file once it has stopped changing:
+
+        - Files already in the folder when watching starts are passed on too, unless the same
+          version has been processed before (see mark_file_processed), so files that arrived
+          while the app was closed are not missed
+        - A file is only passed on once its signature has stayed the same for WATCH_SETTLE_SECONDS
+          and it can be opened, so files that are still being copied in are not read half written
+    """
+    try:
+        processed_files = read_processed_files()
+        seen_files = { # file path: signature of the version that was last passed on
+            file_path: signature
+            for file_path, signature in scan_folder(folder).items()
+            if processed_files.get(os.path.abspath(file_path)) == signature
+        }
+        changing_files = {} # file path: (signature, time it was first seen with that signature)
+
+        while not stop_watching_event.wait(config.WATCH_POLL_SECONDS): # wait returns True as soon as stop_watching is called
+            now = time.monotonic()
+            current_files = scan_folder(folder)
+
+            for file_path, signature in current_files.items():
+                if seen_files.get(file_path) == signature:
+                    continue # unchanged since it was last processed
+
+                if file_path in changing_files and changing_files[file_path][0] == signature:
+                    first_seen_time = changing_files[file_path][1]
+                    if now - first_seen_time >= config.WATCH_SETTLE_SECONDS and can_open_file(file_path):
+                        del changing_files[file_path]
+                        seen_files[file_path] = signature
+                        on_file_ready(file_path)
+                else:
+                    changing_files[file_path] = (signature, now) # new or still being written, so the settle time starts again
+
+            # forget files that have been deleted, so they are processed again if they are added back
+            for file_path in list(seen_files):
+                if file_path not in current_files:
+                    del seen_files[file_path]
+            for file_path in list(changing_files):
+                if file_path not in current_files:
+                    del changing_files[file_path]
+
+    except Exception as e:
+        traceback.print_exc()
+        error_message = f"Error in watch_folder: {e}"
+        messagebox.showerror("Error", error_message)
+
+def start_watching(on_file_ready, folder=config.INPUT_FOLDER):
+    """
+    Starts watching the folder on a background thread, if it is not already being watched.
+    on_file_ready is called from the watcher thread, so it must not change Tkinter widgets directly.
+    """
+    try:
+        global watcher_thread
+
+        if watcher_thread is not None and watcher_thread.is_alive():
+            return
+
+        os.makedirs(folder, exist_ok=True)
+        stop_watching_event.clear()
+        watcher_thread = threading.Thread(target=watch_folder, args=(folder, on_file_ready), daemon=True) # daemon threads don't stop the app from closing
+        watcher_thread.start()
+    except Exception as e:
+        traceback.print_exc()
+        error_message = f"Error in start_watching: {e}"
+        messagebox.showerror("Error", error_message)
+
+def stop_watching():
+    """
+    Stops watching the folder. Files that have already been passed on are still processed.
+    """
+    try:
+        global watcher_thread
+
+        stop_watching_event.set()
+
+        if watcher_thread is not None:
+            watcher_thread.join(timeout=config.WATCH_POLL_SECONDS * 2)
+            watcher_thread = None
+    except Exception as e:
+        traceback.print_exc()
+        error_message = f"Error in stop_watching: {e}"
+        messagebox.showerror("Error", error_message)
+
+def process_watched_file(file_path, selected_columns=None, summary_options=None, results_extension=None):
+    """
+    Generates and saves the results of a file found by the watcher when running without the GUI,
+    the same way the app processes a job. Runs on a worker thread.
+    """
+    try:
+        run_start_time = time.perf_counter()
+        run_stats = create_run_stats()
+        results = generate_documents(file_path, run_stats, selected_columns, summary_options) or []
+
+        save_start_time = time.perf_counter()
+        saved_results_files, save_failed = save_results_files(results, results_extension)
+        add_stage_time(run_stats, "save", time.perf_counter() - save_start_time)
+
+        succeeded = bool(results) and all(dataframe is not None for source_name, dataframe in results) and not save_failed
+        record_run(os.path.basename(file_path), os.path.getsize(file_path), run_stats, time.perf_counter() - run_start_time, succeeded)
+
+        if succeeded:
+            mark_file_processed(file_path)
+        print(f"{'done' if succeeded else 'failed':>7}  {file_path}  ->  {', '.join(saved_results_files)}")
+    except Exception as e:
+        traceback.print_exc()
+        error_message = f"Error in process_watched_file: {e}"
+        messagebox.showerror("Error", error_message)
+
+def run_headless_watch(folder=config.INPUT_FOLDER, selected_columns=None, summary_options=None, results_extension=None):
+    """
+    Watches the folder without opening the GUI until the process is stopped (e.g. with Ctrl+C),
+    processing at most MAX_WORKERS files at the same time. Files that arrived while nothing was
+    watching are processed as soon as it starts.
+    """
+    try:
+        executor = ThreadPoolExecutor(max_workers=config.MAX_WORKERS)
+        start_watching(lambda file_path: executor.submit(process_watched_file, file_path, selected_columns, summary_options, results_extension), folder)
+        print(f"Watching {folder}. Press Ctrl+C to stop")
+
+        try:
+            while watcher_thread is not None and watcher_thread.is_alive():
+                time.sleep(config.WATCH_POLL_SECONDS)
+        except KeyboardInterrupt:
+            pass
+
+        stop_watching()
+        executor.shutdown(wait=True) # files already passed on are finished before the process exits
+    except Exception as e:
+        traceback.print_exc()
+        error_message = f"Error in run_headless_watch: {e}"
+        messagebox.showerror("Error", error_message)
@@ -0,0 +1,146 @@
+"""
+This file is part of Gene Matcher.
+Licensed under the Creative Commons Attribution-NonCommercial 4.0 International License.
+See LICENSE file for details: https://creativecommons.org/licenses/by-nc/4.0/
+"""
+import pandas as pd
+from .documentGenerator import format_cell
+
+"""
+Matches gene lists held in memory (lists, pandas Series or NumPy arrays) from Python code,
+e.g. a notebook or a pipeline, without writing a spreadsheet or opening the GUI:
+
+    from modules.geneMatcher import GeneMatcher
+
+    matcher = GeneMatcher()
+    matcher.add_column("reference", reference_genes)             # indexed once, reused by every match
+    results_df = matcher.match("reference", sample_genes)
+    results_dfs = matcher.match_many([("reference", sample) for sample in samples])
+
+Results are in the same format as generate_document: a 'Gene' column, then one 'Column N'
+column per input holding the row numbers the gene appears on. Row numbers are those the
+values would have in a spreadsheet with a heading row (the first value is on row 2),
+unless a different position_offset is given.
+
+CLASSES
+
+class GeneMatcher
+"""
+
+class GeneMatcher:
+    """
+    Keeps the normalised form of every value it has seen and the index of every named column
+    between calls, so many small matches can be run quickly one after another.
+    """
+
+    def __init__(self, position_offset=2, max_cached_values=1_000_000):
+        self.position_offset = position_offset
+        self.max_cached_values = max_cached_values
+        self.normalized_values = {} # value: string it is matched as (the result of format_cell)
+        self.column_indexes = {} # column name: index built by add_column
+
+    def normalize(self, value):
+        """
+        Returns the string a cell value is matched as, using the cached result where possible.
+        """
+        try:
+            return self.normalized_values[value]
+        except KeyError:
+            if len(self.normalized_values) >= self.max_cached_values:
+                self.normalized_values.clear() # keeps memory bounded for very long running sessions
+            normalized_value = format_cell(value)
+            self.normalized_values[value] = normalized_value
+            return normalized_value
+        except TypeError:
+            return format_cell(value) # unhashable values can't be cached
+
+    def build_index(self, values):
+        """
+        Returns a dictionary of normalised value: row numbers it appears on, in order of first appearance.
+        Empty cells are skipped, except in numeric columns where they count as 0, as they do when a spreadsheet is read.
+        """
+        series = values if isinstance(values, pd.Series) else pd.Series(values)
+
+        if pd.api.types.is_numeric_dtype(series): # the same cleaning clean_dataframe_to_integers applies to a spreadsheet
+            series = series.fillna(0).astype(int)
+
+        index = {}
+        for position, value in enumerate(series.tolist()): # tolist converts NumPy numbers to Python numbers, which format_cell expects
+            if pd.isna(value):
+                continue
+            index.setdefault(self.normalize(value), []).append(position + self.position_offset)
+
+        return index
+
+    def add_column(self, name, values):
+        """
+        Indexes a column once and keeps it under a name, so it can be matched against many other columns.
+        Adding a column with an existing name replaces it.
+        """
+        self.column_indexes[name] = self.build_index(values)
+
+    def remove_column(self, name):
+        """
+        Forgets a column added with add_column.
+        """
+        self.column_indexes.pop(name, None)
+
+    def get_index(self, column, batch_indexes=None):
+        """
+        Returns the index of a column given by name, or builds it for a column of values.
+        batch_indexes lets the same column object be indexed only once within match_many.
+        It holds (column, index) pairs keyed by the id of the column.
+        """
+        if isinstance(column, str):
+            if column not in self.column_indexes:
+                raise ValueError(f"No column has been added with the name '{column}'")
+            return self.column_indexes[column]
+
+        if batch_indexes is None:
+            return self.build_index(column)
+
+        column_key = id(column)
+        if column_key not in batch_indexes:
+            batch_indexes[column_key] = (column, self.build_index(column)) # keeping the column stops its id being reused by another column while the batch runs, e.g. when column_groups is a generator
+        return batch_indexes[column_key][1]
+
+    def match_indexes(self, indexes):
+        """
+        Returns a DataFrame of the genes found in every index and the row numbers they appear on.
+        """
+        if len(indexes) < 2:
+            raise ValueError("At least two columns are needed to match")
+
+        smallest_index = min(indexes, key=len) # only the genes in the smallest column can be in every column
+        matching_genes = [gene for gene in smallest_index if all(gene in index for index in indexes)]
+        matching_genes.sort(key=lambda gene: indexes[0][gene][0]) # results are in the order the genes first appear in the first column, as they are for a spreadsheet
+
+        rows = []
+        for gene in matching_genes:
+            row = {"Gene": gene}
+            for set_number, index in enumerate(indexes, start=1):
+                row[f"Column {set_number}"] = list(index[gene])
+            rows.append(row)
+
+        columns = ["Gene"] + [f"Column {set_number}" for set_number in range(1, len(indexes) + 1)]
+        return pd.DataFrame(rows, columns=columns)
+
+    def match(self, *columns):
+        """
+        Matches two or more columns. Each column is either the name of a column added with
+        add_column, or the values themselves.
+        """
+        return self.match_indexes([self.get_index(column) for column in columns])
+
+    def match_many(self, column_groups):
+        """
+        Runs a match for every group of columns (e.g. a list of pairs) and returns a list of DataFrames.
+        A column object used in several groups is only indexed once.
+        """
+        batch_indexes = {}
+        results = []
+
+        for columns in column_groups:
+            results.append(self.match_indexes([self.get_index(column, batch_indexes) for column in columns]))
+
+        return results
@@ -6,31 +6,78 @@ See LICENSE file for details: https://creativecommons.org/licenses/by-nc/4.0/
 import config
 import os
 import tkinter as tk
+from tkinter import ttk
 from tkinter import filedialog
 from tkinter import messagebox
 import traceback
 import webbrowser
-from .documentGenerator import generate_document
-from .fileHandler import clear_files, save_file, truncate_filename, get_file_extension
-from .userDataHandler import track_use
+import time
+import bisect
+import queue
+import threading
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from .documentGenerator import generate_documents, read_source_headers, create_summary_options
+from .fileHandler import save_results_files, truncate_filename, get_file_extension, get_source_extensions
+from .folderWatcher import start_watching, stop_watching, mark_file_processed
+from .userDataHandler import create_run_stats, add_stage_time, record_run, get_number_of_uses, read_settings, save_setting
 import pandas as pd
 
+try:
+    from tkinterdnd2 import TkinterDnD, DND_FILES # optional: enables dragging files onto the job table
+except ImportError:
+    TkinterDnD = None
+
 """
 FUNCTIONS
 
 def adjust_font
+def use_thread_safe_messages
+def add_files_to_queue
 def select_file
+def drop_files
+def choose_columns
+def read_headers
+def display_column_chooser
+def update_status_label
+def submit_jobs
 def submit
+def toggle_watch_folder
 def process_file
+def poll_job_updates
+def check_donation_reminder
+def get_selected_job
+def select_job
 def display_donation_reminder
 def display_results_file_link
+def build_results_index
+def search_results_index
+def load_next_results_page
+def reload_results_viewer
+def display_results_viewer
 def display_donation_options
 def setup_gui
 """
 
 # Global variables
-source_file_path = None
 status_label = None
+jobs = {} # job id: job dictionary, for every file added to the queue
+job_updates = queue.Queue() # ids of jobs whose status has changed, messages to show and column headings read for choose_columns, from other threads. Handled on the main thread
+job_executor = None # bounded pool of worker threads that process the jobs
+next_job_id = 1
+watched_files = queue.Queue() # files found by the folder watcher thread, added to the job queue on the main thread
+watch_folder_enabled = None # Tkinter variable for the watch input folder checkbox
+results_format = None # Tkinter variable for the results format drop down
+results_format_options = ["Same as input", ".xlsx", ".ods", ".csv", ".tsv", ".sqlite"]
+output_mode = None # Tkinter variable for the output mode drop down (see config.OUTPUT_MODES)
+min_occurrences = None # Tkinter variable for the minimum number of times a reported gene must appear, 0 for no minimum
+top_k = None # Tkinter variable for the number of genes reported, 0 for every gene
+last_number_of_uses = None # use count when the donation reminder was last checked
+donation_reminder_interval = 50 # the reminder is shown each time the use count passes a multiple of this
+job_poll_interval = 100 # milliseconds between checks for job updates
+jobs_with_results = deque() # ids of the finished jobs whose results are still kept for the results viewer, oldest first
+results_kept_jobs = 10 # results of older jobs are dropped, so memory doesn't keep growing while the input folder is watched. Their results files are kept
+results_page_size = 200 # number of rows the results viewer adds to the table each time the user scrolls near the bottom
 paypal_url = 'https://paypal.me/Davinder321?country.x=GB&locale.x=en_GB'
 
 
@@ -50,37 +97,94 @@ def adjust_font(event=None):
             new_font = ("Arial", new_size)
 
             select_button.config(font=new_font)
+            columns_button.config(font=new_font)
             submit_button.config(font=new_font)
             status_label.config(font=new_font)
             contact_details.config(font=new_font)
             results_button.config(font=new_font)
+            view_results_button.config(font=new_font)
 
     except Exception as e:
         traceback.print_exc()
         messagebox.showerror("Error", f"An error occurred in adjust_font: {e}")
 
-def select_file():
+def use_thread_safe_messages():
+    """
+    Tkinter pop ups must only be opened from the main thread, but the processing functions
+    report errors with messagebox while they run on worker threads and the folder watcher thread.
+    Messages from other threads are put on job_updates instead and shown by poll_job_updates.
+    """
+    def make_thread_safe(show_message):
+        def show_or_queue_message(title, message, **options):
+            if threading.current_thread() is threading.main_thread():
+                return show_message(title, message, **options)
+            job_updates.put(("message", show_message, title, message)) # options such as parent refer to widgets, which only the main thread may use
+
+        return show_or_queue_message
+
+    messagebox.showerror = make_thread_safe(messagebox.showerror)
+    messagebox.showwarning = make_thread_safe(messagebox.showwarning)
+    messagebox.showinfo = make_thread_safe(messagebox.showinfo)
+
+def add_files_to_queue(file_paths):
     """
-    Open a file dialog to allow the user to select an Excel file.
-    The selected file's path is stored in the global variable 'source_file_path'.
+    Adds a job to the queue for every supported file, skipping any other files.
+    Returns the jobs that were added.
     """
     try:
-        global source_file_path # the global keyword makes sure the variable refers to the global variable already created, rather than having a new local variable created
-        global status_label
+        global next_job_id
+
+        added_jobs = []
+        supported_extensions = config.SPREADSHEET_EXTENSIONS + config.TEXT_EXTENSIONS + config.ARCHIVE_EXTENSIONS
 
+        for file_path in file_paths:
+            file_extension = get_file_extension(file_path)
+            data_extension, compression_extension = get_source_extensions(file_path)
+            if file_extension not in supported_extensions and data_extension not in supported_extensions:
+                continue
+
+            job = {
+                "job_id": str(next_job_id), # used as the id of the row in the job table
+                "source_file_path": file_path,
+                "status": "Queued",
+                "selected_columns": None, # None matches the first two columns
+                "results_extension": None, # set when the job is submitted
+                "summary_options": None, # set when the job is submitted
+                "seconds": None,
+                "results": [], # (source name, DataFrame) pairs, shown in the results viewer. Only kept for the last results_kept_jobs jobs
+                "saved_results_file": None,
+                "watched": False, # True for files found by the folder watcher
+                "finish_handled": False # set once poll_job_updates has handled the job finishing
+            }
+            next_job_id += 1
+            jobs[job["job_id"]] = job
+            added_jobs.append(job)
+
+            file_name_truncated = truncate_filename(os.path.basename(file_path), max_length=40)
+            job_tree.insert("", "end", iid=job["job_id"], values=(file_name_truncated, "First two", job["status"], ""))
+
+        update_status_label()
+        return added_jobs
+    except Exception as e:
+        traceback.print_exc()
+        error_message = f"An error occurred in add_files_to_queue: {e}"
+        messagebox.showerror("Error", error_message)
+
+def select_file():
+    """
+    Open a file dialog to allow the user to select one or more input files.
+    Each selected file is added to the job queue.
+    """
+    try:
         filetypes = [
-            ("Spreadsheet files", "*.xls *.xlsx *.ods") #first element is a description of the file type. The next element is a list of permitted file types
+            ("Spreadsheet files", "*.xls *.xlsx *.ods"), #first element is a description of the file type. The next element is a list of permitted file types
+            ("Text files", "*.csv *.tsv *.txt"),
+            ("Compressed files", "*.gz *.bz2 *.zip")
         ]
         
-        source_file_path = filedialog.askopenfilename(filetypes=filetypes) # Opens the file dialog for the user to select a file and blocks the program execution. Once the user has selected a file, the file path is returned
+        source_file_paths = filedialog.askopenfilenames(filetypes=filetypes) # Opens the file dialog for the user to select files and blocks the program execution. Once the user has selected the files, a tuple of file paths is returned
 
-        if source_file_path:
-            file_name = os.path.basename(source_file_path) #gets the filename on the end of the file path
-            file_name_truncated = truncate_filename(file_name)
-            status_label.config(text=f"Selected: {file_name_truncated}") #f strings allow you to insert variables into strings
-            results_button.config(state=tk.DISABLED)
-        else:
-            status_label.config(text="No file selected")
+        add_files_to_queue(source_file_paths)
 
         # refresh layout after file dialog closes (needed to fix a bug)
         root_window.update_idletasks() 
@@ -89,58 +193,356 @@ def select_file():
         error_message = f"An error occurred in select_file: {e}"
         messagebox.showerror("Error", error_message)
 
+def drop_files(event):
+    """
+    Adds files dragged onto the job table to the queue.
+    """
+    try:
+        file_paths = root_window.tk.splitlist(event.data) # paths containing spaces are wrapped in braces, splitlist unwraps them
+        add_files_to_queue(file_paths)
+    except Exception as e:
+        traceback.print_exc()
+        error_message = f"An error occurred in drop_files: {e}"
+        messagebox.showerror("Error", error_message)
+
+def choose_columns():
+    """
+    Lets the user choose which two or more columns of the selected job's file to match.
+    The column headings are read on a separate thread (see read_headers), as .xls and .ods
+    workbooks are loaded in full even though only the first few rows are needed,
+    and the pop up is shown by poll_job_updates once they have been read.
+    """
+    try:
+        job = get_selected_job()
+
+        if not job:
+            messagebox.showwarning("No File", "Please select a file in the table first.")
+            return
+        if job["status"] != "Queued":
+            messagebox.showwarning("Already Submitted", "Columns can only be chosen before a file is submitted.")
+            return
+
+        status_label.config(text=f"Reading the columns of {truncate_filename(os.path.basename(job['source_file_path']), max_length=40)}...")
+        threading.Thread(target=read_headers, args=(job["job_id"], job["source_file_path"]), daemon=True).start()
+
+    except Exception as e:
+        traceback.print_exc()
+        error_message = f"An error occurred in choose_columns: {e}"
+        messagebox.showerror("Error", error_message)
+
+def read_headers(job_id, source_file_path):
+    """
+    Runs on its own thread. Reads the column headings of a file and puts them on job_updates,
+    so reading a large workbook doesn't freeze the window.
+    """
+    headers = read_source_headers(source_file_path) # None if an error occurred, which has already been reported
+    job_updates.put(("headers", job_id, headers))
+
+def display_column_chooser(job, headers):
+    """
+    Displays a pop up listing the column headings of a job's file, with the columns
+    the job already uses (or the first two) selected.
+    """
+    try:
+        update_status_label()
+
+        if headers is None: # the error has already been shown to the user
+            return
+        if job["status"] != "Queued": # the file was submitted while its headings were being read
+            return
+
+        popup = tk.Toplevel(root_window)
+        popup.title("Choose Columns")
+        popup.geometry("300x350")
+
+        label = tk.Label(
+            popup,
+            text="Select two or more columns to match:",
+            font=("Arial", 12),
+            fg="black",
+            wraplength=280,
+            justify="center"
+        )
+        label.pack(pady=5)
+
+        column_listbox = tk.Listbox(popup, selectmode=tk.MULTIPLE, exportselection=False) # MULTIPLE lets the user toggle several rows by clicking them
+        for header in headers:
+            column_listbox.insert("end", str(header))
+        column_listbox.pack(fill="both", expand=True, padx=10)
+
+        selected_columns = job["selected_columns"] or headers[:2]
+        for index, header in enumerate(headers):
+            if header in selected_columns:
+                column_listbox.selection_set(index)
+
+        def save_columns():
+            chosen_columns = [headers[index] for index in column_listbox.curselection()]
+
+            if len(chosen_columns) < 2:
+                messagebox.showwarning("Insufficient Columns", "Please choose at least two columns to match.", parent=popup)
+                return
+
+            job["selected_columns"] = chosen_columns
+            job_tree.set(job["job_id"], "Columns", truncate_filename(", ".join(str(column) for column in chosen_columns), max_length=30))
+            popup.destroy()
+
+        ok_button = tk.Button(
+            popup,
+            text="OK",
+            cursor="hand2",
+            command=save_columns
+        )
+        ok_button.pack(pady=5)
+
+    except Exception as e:
+        traceback.print_exc()
+        error_message = f"An error occurred in display_column_chooser: {e}"
+        messagebox.showerror("Error", error_message)
+
+def update_status_label():
+    """
+    Shows how many jobs are queued, running and finished.
+    """
+    try:
+        if not jobs:
+            status_label.config(text="No file selected")
+            return
+
+        statuses = [job["status"] for job in jobs.values()]
+        queued = statuses.count("Queued")
+        running = statuses.count("Waiting") + statuses.count("Running")
+        finished = len(statuses) - queued - running
+
+        status_label.config(text=f"{queued} queued, {running} running, {finished} finished")
+    except Exception as e:
+        traceback.print_exc()
+        error_message = f"An error occurred in update_status_label: {e}"
+        messagebox.showerror("Error", error_message)
+
+def submit_jobs(jobs_to_submit):
+    """
+    Sends jobs to the worker pool, which processes at most MAX_WORKERS of them at the same time.
+    The results format and summary options are read here, as Tkinter variables must only be read on the main thread.
+    """
+    try:
+        chosen_format = results_format.get()
+
+        try:
+            summary_options = create_summary_options(output_mode.get(), min_occurrences.get(), top_k.get())
+        except (tk.TclError, ValueError): # the user typed something that isn't a whole number
+            messagebox.showwarning("Invalid Number", "The minimum occurrences and top genes must be whole numbers of 0 or more.")
+            return
+
+        for job in jobs_to_submit:
+            job["results_extension"] = None if chosen_format == results_format_options[0] else chosen_format # None saves the results in the same format as the input
+            job["summary_options"] = summary_options
+            job["status"] = "Waiting"
+            job_updates.put(job["job_id"])
+            job_executor.submit(process_file, job)
+    except Exception as e:
+        traceback.print_exc()
+        error_message = f"An error occurred in submit_jobs: {e}"
+        messagebox.showerror("Error", error_message)
+
 def submit():
     """
     carries out the tasks that need to be performed when the submit button is pressed:
 
-        - Process the file
-        - Record the number of times the user has used the app
-        - Display a donation request if uses are a multiple of 50
+        - Sends every queued job to the worker pool
+        - The donation reminder is checked as each job finishes (see poll_job_updates)
     """
     try:
-        numberOfUses = track_use()
-        results_file = process_file()
+        queued_jobs = [job for job in jobs.values() if job["status"] == "Queued"]
 
-        if numberOfUses % 50 == 0:
-            display_donation_reminder(numberOfUses)
+        if not queued_jobs:
+            messagebox.showwarning("No File", "Please select a file before submitting.")
+            return
 
-        display_results_file_link(results_file)
+        submit_jobs(queued_jobs)
     
     except Exception as e:
         traceback.print_exc()
         error_message = f"An error occurred in submit: {e}"
         messagebox.showerror("Error", error_message)
 
+def toggle_watch_folder():
+    """
+    Starts or stops watching the input folder when the checkbox is clicked.
+    New or modified files in the folder are submitted automatically, and their results
+    are saved to the results folder like any other job.
+    The setting is saved, so watching starts again the next time the app is opened.
+    """
+    try:
+        save_setting("watch_input_folder", watch_folder_enabled.get())
 
+        if watch_folder_enabled.get():
+            start_watching(watched_files.put) # the watcher thread only puts file paths on the queue, poll_job_updates adds them to the table
+        else:
+            stop_watching()
+    except Exception as e:
+        traceback.print_exc()
+        error_message = f"An error occurred in toggle_watch_folder: {e}"
+        messagebox.showerror("Error", error_message)
 
-def process_file():
+def process_file(job):
     """
-    Process the selected file by copying it, generating a document from it, 
-    and saving the results to the specified folder.
+    Runs on a worker thread. Generates a document from the job's file and saves
+    the results to a uniquely named file, so earlier results are never overwritten.
+    The size, match count and stage timings of the run are recorded in the run history.
     """
     try:
-        if not source_file_path: # global keyword is not needed as the global variable is not being modified
-            messagebox.showwarning("No File", "Please select a file before submitting.")
-            return
-        clear_files() #Clear old files from the folders
-        resultFile = generate_document(source_file_path) # Generate a data frame using the copied file
+        job["status"] = "Running"
+        job_updates.put(job["job_id"])
+
+        source_file_path = job["source_file_path"]
+        run_start_time = time.perf_counter()
+        run_stats = create_run_stats()
+        results = generate_documents(source_file_path, run_stats, job["selected_columns"], job["summary_options"]) or [] # Generate a data frame for the file, or for each file inside a zip archive
         
-        # Saving the file
-        file_extension = get_file_extension(source_file_path)
-        savedResultsFile = save_file(resultFile, f'results{file_extension}', config.RESULTS_FOLDER)
+        # Saving the files
+        save_start_time = time.perf_counter()
+        saved_results_files, save_failed = save_results_files(results, job["results_extension"])
+        add_stage_time(run_stats, "save", time.perf_counter() - save_start_time)
+
+        if len(saved_results_files) == 1:
+            savedResultsFile = saved_results_files[0]
+        elif saved_results_files:
+            savedResultsFile = config.RESULTS_FOLDER # a batch opens the folder containing every results file
+        else:
+            savedResultsFile = None
+
+        total_seconds = time.perf_counter() - run_start_time
+        succeeded = bool(results) and all(resultFile is not None for source_name, resultFile in results) and not save_failed
+        record_run(os.path.basename(source_file_path), os.path.getsize(source_file_path), run_stats, total_seconds, succeeded)
 
-        # Configure the results button to open the file
-        if savedResultsFile:
-            results_button.config(
-                command=lambda: os.startfile(savedResultsFile)  # Open the file
-            )
+        job["results"] = [(source_name, resultFile) for source_name, resultFile in results if resultFile is not None]
+        job["saved_results_file"] = savedResultsFile
+        job["seconds"] = total_seconds
+        job["status"] = "Done" if succeeded else "Failed"
+
+        if succeeded and job["watched"]:
+            mark_file_processed(source_file_path) # it won't be processed again when watching starts next time, unless it changes
 
         return savedResultsFile
     
     except Exception as e:
+        job["status"] = "Failed"
         traceback.print_exc()
         error_message = f"An error occurred in process_file: {e}"
         messagebox.showerror("Error", error_message)
+    finally:
+        job_updates.put(job["job_id"])
+
+def poll_job_updates():
+    """
+    Runs on the main thread every job_poll_interval milliseconds.
+    Tkinter widgets must only be changed from the main thread, so worker threads
+    report changes and messages through job_updates and they are handled here.
+    """
+    try:
+        while not watched_files.empty():
+            watched_jobs = add_files_to_queue([watched_files.get()])
+            for job in watched_jobs:
+                job["watched"] = True
+            submit_jobs(watched_jobs)
+
+        updated = False
+        finished_jobs = 0
+
+        while not job_updates.empty():
+            update = job_updates.get()
+
+            if isinstance(update, tuple) and update[0] == "headers": # column headings read for choose_columns
+                kind, job_id, headers = update
+                display_column_chooser(jobs[job_id], headers)
+                continue
+
+            if isinstance(update, tuple): # a message from a worker thread (see use_thread_safe_messages)
+                kind, show_message, title, message = update
+                show_message(title, message)
+                continue
+
+            updated = True
+            job = jobs[update]
+            seconds_text = f"{job['seconds']:.1f}s" if job["seconds"] is not None else ""
+            job_tree.set(job["job_id"], "Status", job["status"])
+            job_tree.set(job["job_id"], "Time", seconds_text)
+
+            if job["status"] in ["Done", "Failed"] and not job["finish_handled"]: # a job can be queued several times, but only finishes once
+                job["finish_handled"] = True
+                finished_jobs += 1
+
+                if job["results"]:
+                    jobs_with_results.append(job["job_id"])
+                    if len(jobs_with_results) > results_kept_jobs:
+                        jobs[jobs_with_results.popleft()]["results"] = [] # the oldest job can still be opened with Open Results File
+
+        if finished_jobs:
+            check_donation_reminder()
+
+        if updated:
+            update_status_label()
+            select_job()
+    except Exception as e:
+        traceback.print_exc()
+        error_message = f"An error occurred in poll_job_updates: {e}"
+        messagebox.showerror("Error", error_message)
+    finally:
+        root_window.after(job_poll_interval, poll_job_updates) # checks again later, even if an error occurred
+
+def check_donation_reminder():
+    """
+    Shows the donation reminder if the use count has passed a multiple of donation_reminder_interval
+    since it was last checked. Comparing with the last count means no multiple is missed,
+    even when several jobs finish between checks.
+    """
+    try:
+        global last_number_of_uses
+
+        numberOfUses = get_number_of_uses()
+        if numberOfUses is None:
+            return
+
+        if last_number_of_uses is not None and numberOfUses // donation_reminder_interval > last_number_of_uses // donation_reminder_interval:
+            display_donation_reminder(numberOfUses)
+        last_number_of_uses = numberOfUses
+    except Exception as e:
+        traceback.print_exc()
+        error_message = f"An error occurred in check_donation_reminder: {e}"
+        messagebox.showerror("Error", error_message)
+
+def get_selected_job():
+    """
+    Returns the job selected in the job table, or None if no job is selected.
+    """
+    try:
+        selection = job_tree.selection()
+        if not selection:
+            return None
+
+        return jobs[selection[0]]
+    except Exception as e:
+        traceback.print_exc()
+        error_message = f"An error occurred in get_selected_job: {e}"
+        messagebox.showerror("Error", error_message)
+
+def select_job(event=None):
+    """
+    Enables the results buttons when the selected job has results.
+    """
+    try:
+        job = get_selected_job()
+
+        if job and job["saved_results_file"]:
+            display_results_file_link(job["saved_results_file"])
+            view_results_button.config(state="normal" if job["results"] else "disabled")
+        else:
+            results_button.config(state=tk.DISABLED)
+            view_results_button.config(state=tk.DISABLED)
+    except Exception as e:
+        traceback.print_exc()
+        error_message = f"An error occurred in select_job: {e}"
+        messagebox.showerror("Error", error_message)
 
 def display_donation_options():
     """
@@ -295,6 +697,209 @@ def display_results_file_link(results_file):
         error_message = f"An error occurred in display_results_file_link: {e}"
         messagebox.showerror("Error", error_message)
 
+def build_results_index(results):
+    """
+    Turns the results DataFrames into the rows shown by the results viewer, and builds:
+
+        - a sorted list of (lowercase gene, row number) pairs for fast gene search
+        - the row numbers sorted by match count, highest first
+
+    Results in the 'counts' output mode show their counts, and 'genes-only' results show no match count.
+    """
+    try:
+        rows = []
+        show_source = len(results) > 1 # the source column is only needed when a batch was processed
+        position_columns = ["Column 1", "Column 2"]
+        if results:
+            position_columns = [column for column in results[0][1].columns if str(column).startswith("Column ") or str(column).startswith("Count ")] # every file in a job is matched on the same number of columns and output mode
+        has_counts = bool(results) and "Total" in results[0][1].columns
+
+        for source_name, dataframe in results:
+            if "Gene" not in dataframe.columns: # results with no matching genes may have no columns at all
+                continue
+
+            for gene, *column_values in zip(dataframe["Gene"], *[dataframe[column] for column in position_columns]):
+                if has_counts:
+                    match_count = sum(int(occurrence_count) for occurrence_count in column_values)
+                    row = (gene, match_count) + tuple(int(occurrence_count) for occurrence_count in column_values)
+                elif position_columns:
+                    match_count = sum(len(positions) for positions in column_values)
+                    row = (gene, match_count) + tuple(", ".join(str(position) for position in positions) for positions in column_values)
+                else:
+                    row = (gene, "") # genes-only results have no match count
+                if show_source:
+                    row = (source_name,) + row
+                rows.append(row)
+
+        gene_column = 1 if show_source else 0
+        count_column = gene_column + 1
+
+        results_index = {
+            "rows": rows,
+            "show_source": show_source,
+            "position_columns": position_columns,
+            "sorted_genes": sorted((str(row[gene_column]).lower(), row_number) for row_number, row in enumerate(rows)), # sorted so bisect can find every gene starting with the search text
+            "rows_by_match_count": sorted(range(len(rows)), key=lambda row_number: rows[row_number][count_column] or 0, reverse=True)
+        }
+
+        return results_index
+    except Exception as e:
+        traceback.print_exc()
+        error_message = f"An error occurred in build_results_index: {e}"
+        messagebox.showerror("Error", error_message)
+
+def search_results_index(results_index, search_text):
+    """
+    Returns the row numbers of every gene that starts with the search text (case insensitive).
+    Uses a binary search on the sorted gene list, so it stays fast on very large results.
+    """
+    try:
+        search_text = search_text.strip().lower()
+        sorted_genes = results_index["sorted_genes"]
+
+        start = bisect.bisect_left(sorted_genes, (search_text, -1)) # -1 sorts before every row number, so this finds the first gene starting with the search text
+        matching_rows = []
+
+        for gene, row_number in sorted_genes[start:]:
+            if not gene.startswith(search_text):
+                break
+            matching_rows.append(row_number)
+
+        return sorted(matching_rows)
+    except Exception as e:
+        traceback.print_exc()
+        error_message = f"An error occurred in search_results_index: {e}"
+        messagebox.showerror("Error", error_message)
+
+def load_next_results_page(tree, viewer_state):
+    """
+    Adds the next page of rows to the results table. Only the rows the user scrolls to
+    are ever added, so the viewer opens instantly however large the results are.
+    """
+    try:
+        rows = viewer_state["results_index"]["rows"]
+        row_order = viewer_state["row_order"]
+        start = viewer_state["loaded_rows"]
+        end = min(start + results_page_size, len(row_order))
+
+        for row_number in row_order[start:end]:
+            tree.insert("", "end", values=rows[row_number])
+
+        viewer_state["loaded_rows"] = end
+    except Exception as e:
+        traceback.print_exc()
+        error_message = f"An error occurred in load_next_results_page: {e}"
+        messagebox.showerror("Error", error_message)
+
+def reload_results_viewer(tree, viewer_state, row_order, summary_label):
+    """
+    Empties the results table and starts loading the given rows from the first page.
+    """
+    try:
+        tree.delete(*tree.get_children())
+        viewer_state["row_order"] = row_order
+        viewer_state["loaded_rows"] = 0
+        load_next_results_page(tree, viewer_state)
+        tree.yview_moveto(0)
+
+        total_rows = len(viewer_state["results_index"]["rows"])
+        summary_label.config(text=f"Showing {len(row_order)} of {total_rows} genes")
+    except Exception as e:
+        traceback.print_exc()
+        error_message = f"An error occurred in reload_results_viewer: {e}"
+        messagebox.showerror("Error", error_message)
+
+def display_results_viewer():
+    """
+    Displays the results of the selected job in a table inside the app:
+
+        - Rows are loaded in pages as the user scrolls
+        - Genes can be searched by the start of their name
+        - Rows can be sorted by match count
+    """
+    try:
+        job = get_selected_job()
+        if not job:
+            return
+
+        results_index = build_results_index(job["results"])
+        viewer_state = {
+            "results_index": results_index,
+            "row_order": [],
+            "loaded_rows": 0
+        }
+        all_rows = list(range(len(results_index["rows"])))
+
+        popup = tk.Toplevel(root_window)
+        popup.title(f"Results: {os.path.basename(job['source_file_path'])}")
+        popup.geometry("700x500")
+        popup.grid_rowconfigure(1, weight=1)
+        popup.grid_columnconfigure(0, weight=1)
+
+        # Search and sort controls
+        controls = tk.Frame(popup)
+        controls.grid(row=0, column=0, columnspan=2, sticky="ew", padx=5, pady=5)
+
+        search_entry = tk.Entry(controls)
+        search_entry.pack(side="left", fill="x", expand=True)
+
+        summary_label = tk.Label(controls, fg="gray")
+
+        columns = ["Gene", "Matches"] + results_index["position_columns"]
+        if results_index["show_source"]:
+            columns = ["Source"] + columns
+
+        tree = ttk.Treeview(popup, columns=columns, show="headings")
+        for column in columns:
+            tree.heading(column, text=column)
+            tree.column(column, width=80 if column == "Matches" else 150, stretch=column not in ["Matches"])
+
+        scrollbar = ttk.Scrollbar(popup, orient="vertical", command=tree.yview)
+
+        def on_scroll(first, last):
+            scrollbar.set(first, last)
+            if float(last) > 0.9 and viewer_state["loaded_rows"] < len(viewer_state["row_order"]): # load the next page before the user reaches the bottom
+                load_next_results_page(tree, viewer_state)
+
+        tree.configure(yscrollcommand=on_scroll)
+        tree.grid(row=1, column=0, sticky="nsew")
+        scrollbar.grid(row=1, column=1, sticky="ns")
+
+        search_button = tk.Button(
+            controls,
+            text="Search",
+            command=lambda: reload_results_viewer(tree, viewer_state, search_results_index(results_index, search_entry.get()), summary_label)
+        )
+        search_button.pack(side="left", padx=5)
+        search_entry.bind("<Return>", lambda event: search_button.invoke())
+
+        clear_button = tk.Button(
+            controls,
+            text="Clear",
+            command=lambda: [search_entry.delete(0, "end"), reload_results_viewer(tree, viewer_state, all_rows, summary_label)]
+        )
+        clear_button.pack(side="left")
+
+        def sort_by_matches():
+            shown_rows = set(viewer_state["row_order"]) # keeps any search that has been applied
+            sorted_rows = [row_number for row_number in results_index["rows_by_match_count"] if row_number in shown_rows]
+            reload_results_viewer(tree, viewer_state, sorted_rows, summary_label)
+
+        sort_button = tk.Button(
+            controls,
+            text="Sort by Matches",
+            command=sort_by_matches
+        )
+        sort_button.pack(side="left", padx=5)
+        summary_label.pack(side="left", padx=5)
+
+        reload_results_viewer(tree, viewer_state, all_rows, summary_label)
+
+    except Exception as e:
+        traceback.print_exc()
+        error_message = f"An error occurred in display_results_viewer: {e}"
+        messagebox.showerror("Error", error_message)
+
 def setup_gui():
     """
     - Sets up the main window
@@ -302,27 +907,121 @@ def setup_gui():
     - Runs the event loop
     """
     try:
-        global select_button, submit_button, status_label, results_button, contact_details, root_window  # Needed for adjust_font function
+        global select_button, columns_button, submit_button, status_label, results_button, view_results_button, contact_details, root_window  # Needed for adjust_font function
+        global job_tree, job_executor, watch_folder_enabled, results_format, output_mode, min_occurrences, top_k, last_number_of_uses
 
-        root_window = tk.Tk()  # The main window
+        if TkinterDnD:
+            root_window = TkinterDnD.Tk()  # The main window, with drag and drop support
+        else:
+            root_window = tk.Tk()  # The main window
         root_window.title("Gene Matcher")
-        root_window.geometry("500x500")
+        root_window.geometry("500x600")
+
+        job_executor = ThreadPoolExecutor(max_workers=config.MAX_WORKERS) # at most MAX_WORKERS jobs are processed at the same time
+        use_thread_safe_messages()
+        last_number_of_uses = get_number_of_uses() # the count before any job in this session has run
 
-        # Creates a grid of 9 rows and 3 columns. The weights are equal so the rows and columns take up the same amount of space within their container.
-        for row in range(9):  
+        # Creates a grid of 10 rows and 3 columns. The weights are equal so the rows and columns take up the same amount of space within their container.
+        for row in range(10):  
             root_window.grid_rowconfigure(row, weight=1)
 
         for column in range(3):  
             root_window.grid_columnconfigure(column, weight=1)
 
+        # Job table, showing every file added to the queue
+        job_tree = ttk.Treeview(
+            master=root_window,
+            columns=["File", "Columns", "Status", "Time"],
+            show="headings",
+            selectmode="browse", # only one job can be selected at a time
+            height=5
+        )
+        job_tree.heading("File", text="File")
+        job_tree.heading("Columns", text="Columns")
+        job_tree.heading("Status", text="Status")
+        job_tree.heading("Time", text="Time")
+        job_tree.column("File", width=180)
+        job_tree.column("Columns", width=100)
+        job_tree.column("Status", width=80, stretch=False)
+        job_tree.column("Time", width=60, stretch=False)
+        job_tree.grid(row=0, rowspan=2, column=0, columnspan=3, padx=10, pady=10, sticky="nsew")
+        job_tree.bind("<<TreeviewSelect>>", select_job)
+
+        if TkinterDnD:
+            job_tree.drop_target_register(DND_FILES)
+            job_tree.dnd_bind("<<Drop>>", drop_files)
+
+        # Watch input folder checkbox
+        watch_folder_enabled = tk.BooleanVar(master=root_window, value=read_settings().get("watch_input_folder", False))
+        watch_checkbox = tk.Checkbutton(
+            master=root_window,
+            text="Automatically process files added to the input folder",
+            variable=watch_folder_enabled,
+            command=toggle_watch_folder
+        )
+        watch_checkbox.grid(row=2, column=0, columnspan=2, sticky="nsew")
+        if watch_folder_enabled.get(): # watching was left on last session
+            start_watching(watched_files.put)
+
+        # Results format drop down. SQLite databases can hold far more rows than a spreadsheet and can be queried
+        results_format = tk.StringVar(master=root_window, value=results_format_options[0])
+        results_format_dropdown = ttk.Combobox(
+            master=root_window,
+            textvariable=results_format,
+            values=results_format_options,
+            state="readonly", # stops the user typing their own format
+            width=14
+        )
+        results_format_dropdown.grid(row=2, column=2, padx=10)
+
+        # Summary options. Reporting only the genes or their counts, or fewer genes, skips collecting positions that wouldn't be shown
+        report_frame = tk.Frame(master=root_window)
+        report_frame.grid(row=3, column=0, columnspan=3, padx=10, sticky="nsew")
+
+        output_mode = tk.StringVar(master=root_window, value=config.OUTPUT_MODES[0])
+        min_occurrences = tk.IntVar(master=root_window, value=0)
+        top_k = tk.IntVar(master=root_window, value=0)
+
+        tk.Label(master=report_frame, text="Report").pack(side="left")
+        output_mode_dropdown = ttk.Combobox(
+            master=report_frame,
+            textvariable=output_mode,
+            values=config.OUTPUT_MODES,
+            state="readonly",
+            width=10
+        )
+        output_mode_dropdown.pack(side="left", padx=(5, 10))
+
+        tk.Label(master=report_frame, text="Min occurrences").pack(side="left")
+        tk.Spinbox(master=report_frame, from_=0, to=1000000, textvariable=min_occurrences, width=6).pack(side="left", padx=(5, 10))
+
+        tk.Label(master=report_frame, text="Top genes").pack(side="left")
+        tk.Spinbox(master=report_frame, from_=0, to=1000000, textvariable=top_k, width=6).pack(side="left", padx=5) # 0 reports every gene
+
+        # Frame holding the buttons for adding files and choosing their columns side by side
+        select_frame = tk.Frame(master=root_window)
+        select_frame.grid(row=4, column=1, pady=10, sticky="nsew")  # pady provides padding above and below the widget. sticky="nsew" expands the widget in all directions (fills entire cell)
+        select_frame.grid_rowconfigure(0, weight=1)
+        select_frame.grid_columnconfigure(0, weight=1)
+        select_frame.grid_columnconfigure(1, weight=1)
+
         # Select File button
         select_button = tk.Button(
-            master=root_window, # The parent the widget will attach to 
-            text="Select File",
+            master=select_frame, # The parent the widget will attach to 
+            text="Add Files",
             command=select_file,
             anchor="center"  # Keep text centered
         )
-        select_button.grid(row=3, column=1, pady=10, sticky="nsew")  # pady provides padding above and below the widget. sticky="nsew" expands the widget in all directions (fills entire cell)
+        select_button.grid(row=0, column=0, padx=(0, 5), sticky="nsew")
+
+        # button for choosing which columns of the selected file are matched
+        columns_button = tk.Button(
+            master=select_frame,
+            text="Choose Columns",
+            command=choose_columns,
+            anchor="center"
+        )
+        columns_button.grid(row=0, column=1, sticky="nsew")
 
         # Submit button
         submit_button = tk.Button(
@@ -331,7 +1030,7 @@ def setup_gui():
             command=submit,
             width=15
         )
-        submit_button.grid(row=4, column=1, pady=10, sticky="nsew") 
+        submit_button.grid(row=5, column=1, pady=10, sticky="nsew") 
 
         # Status label
         status_label = tk.Label(
@@ -342,16 +1041,32 @@ def setup_gui():
             justify="center",  # Ensures text is centered
             wraplength=200  # Prevent text from expanding the window (if the window expands this will cause the buttons to resize)
         )
-        status_label.grid(row=5, column=1, pady=10, sticky="nsew") 
+        status_label.grid(row=6, column=1, pady=10, sticky="nsew") 
+
+        # Frame holding the buttons for viewing the results side by side
+        results_frame = tk.Frame(master=root_window)
+        results_frame.grid(row=7, column=1, pady=10, sticky="nsew")
+        results_frame.grid_rowconfigure(0, weight=1)
+        results_frame.grid_columnconfigure(0, weight=1)
+        results_frame.grid_columnconfigure(1, weight=1)
+
+        # button for viewing the results inside the app
+        view_results_button = tk.Button(
+            master=results_frame,
+            text="View Results",
+            state="disabled",
+            command=display_results_viewer
+        )
+        view_results_button.grid(row=0, column=0, padx=(0, 5), sticky="nsew")
 
         # button for viewing the results file
         results_button = tk.Button(
-            master=root_window,
+            master=results_frame,
             text="Open Results File",
             state="disabled", 
             command=lambda: os.startfile(savedResultsFile)  # Opens file when clicked
         )
-        results_button.grid(row=6, column=1, pady=10, sticky="nsew")  
+        results_button.grid(row=0, column=1, sticky="nsew")  
 
         #Donations button
         donate_button = tk.Button(
@@ -363,7 +1078,7 @@ def setup_gui():
             cursor="hand2",
             command=display_donation_options
         )
-        donate_button.grid(row=7, column=1, pady=10, sticky="nsew")
+        donate_button.grid(row=8, column=1, pady=10, sticky="nsew")
 
         #Contact Details
         contact_details = tk.Label(
@@ -376,7 +1091,7 @@ def setup_gui():
             justify="center",   
             wraplength=400  
         )
-        contact_details.grid(row=8, column=1, pady=10, sticky="nsew") 
+        contact_details.grid(row=9, column=1, pady=10, sticky="nsew") 
 
         # Create a Text widget with Arial font
         contact_text = tk.Text(
@@ -406,9 +1121,10 @@ def setup_gui():
         contact_text.tag_bind("link", "<Button-1>", lambda e: webbrowser.open("https://github.com/davindergw/geneMatcher/releases"))
 
         # Place the widget using grid instead of pack
-        contact_text.grid(row=8, column=1, pady=10, sticky="nsew")
+        contact_text.grid(row=9, column=1, pady=10, sticky="nsew")
 
         root_window.bind("<Configure>", adjust_font) # the adjust_font function will be called every time the configure event occurs. The configure event occurs every time the window resizes
+        root_window.after(job_poll_interval, poll_job_updates) # starts checking for jobs finished by the worker threads
         root_window.mainloop()  # Start the Tkinter event loop: An infinite loop that will check for events that have been triggered and redraw the GUI / carry out any function calls in accordance with any events that have occurred
     
     except Exception as e:
@@ -0,0 +1,286 @@
+"""
+This file is part of Gene Matcher.
+Licensed under the Creative Commons Attribution-NonCommercial 4.0 International License.
+See LICENSE file for details: https://creativecommons.org/licenses/by-nc/4.0/
+"""
+import config
+import os
+import json
+import shutil
+import hashlib
+import time
+import threading
+import traceback
+import numpy as np
+import pandas as pd
+
+"""
+Parsing spreadsheets is the slowest part of generating a document, so every input file
+that is read is also saved as a snapshot: the .npy files of each column plus a manifest.
+Later runs on the same file load the .npy files instead of parsing the spreadsheet again.
+
+FUNCTIONS
+
+def get_file_cache_key
+def get_archive_member_cache_key
+def get_snapshot_folder
+def read_manifest
+def encode_text_column
+def decode_text_column
+def read_snapshot
+def write_snapshot
+def get_folder_size
+def evict_snapshots
+"""
+
+# Global variables
+snapshot_format_version = 2 # snapshots saved in an older format are ignored and saved again
+snapshot_lock = threading.Lock() # stops two worker threads in this process writing the same snapshot at the same time. Other processes are kept safe by evict_snapshots skipping recently written snapshots
+
+def get_file_cache_key(file_path):
+    """
+    Returns the key of a file's snapshot: a hash of the file's contents and its modification time.
+    The file is hashed in chunks, so large files are never held in memory.
+    """
+    try:
+        file_hash = hashlib.blake2b(digest_size=20)
+
+        with open(file_path, "rb") as file:
+            for chunk in iter(lambda: file.read(1024 * 1024), b""): # reads 1MB at a time until the end of the file
+                file_hash.update(chunk)
+
+        file_hash.update(str(os.stat(file_path).st_mtime_ns).encode())
+        return file_hash.hexdigest()
+    except Exception as e:
+        traceback.print_exc()
+        return None # the file is read without the cache
+
+def get_archive_member_cache_key(archive_path, member_info):
+    """
+    Returns the key of a zip archive member's snapshot. The archive already stores a checksum
+    of every member, so the member does not need to be decompressed to be hashed.
+    """
+    try:
+        member_hash = hashlib.blake2b(digest_size=20)
+        member_hash.update(member_info.filename.encode())
+        member_hash.update(str((member_info.CRC, member_info.file_size, os.stat(archive_path).st_mtime_ns)).encode())
+        return member_hash.hexdigest()
+    except Exception as e:
+        traceback.print_exc()
+        return None
+
+def get_snapshot_folder(cache_key):
+    """
+    Returns the folder holding the snapshot with the given key.
+    """
+    return os.path.join(config.SNAPSHOT_CACHE_FOLDER, cache_key)
+
+def read_manifest(snapshot_folder):
+    """
+    Returns the manifest of a snapshot, or None if there is no snapshot.
+
+    The manifest records:
+        - version: the snapshot format the files were saved in
+        - headers: every column heading in the file, or None if only some columns have been read
+        - row_count: the number of rows in every column
+        - columns: the file names and kind ('numeric' or 'text') of each column that has been saved
+    """
+    try:
+        with open(os.path.join(snapshot_folder, "manifest.json"), "r") as file:
+            manifest = json.load(file)
+
+        if manifest.get("version") != snapshot_format_version:
+            return None
+        return manifest
+    except (FileNotFoundError, ValueError):
+        return None
+
+def encode_text_column(column_data):
+    """
+    Returns the arrays a text column is saved as:
+
+        - text: every cell joined together and encoded as UTF-8
+        - offsets: the position in the text where each cell starts, plus the end of the last cell
+        - missing: True for every empty cell
+
+    Each cell only takes up as much space as its own text, unlike a fixed width string array
+    where every cell takes up as much space as the longest one.
+    """
+    missing = column_data.isna().to_numpy()
+    cells = column_data.where(~missing, "").astype(str).tolist()
+
+    offsets = np.zeros(len(cells) + 1, dtype=np.int64)
+    np.cumsum([len(cell) for cell in cells], out=offsets[1:]) # offsets count characters, so the decoded text can be sliced directly
+    text = np.frombuffer("".join(cells).encode("utf-8"), dtype=np.uint8)
+
+    return text, offsets, missing
+
+def decode_text_column(text, offsets, missing):
+    """
+    Turns the arrays saved by encode_text_column back into a column of strings, with empty cells put back.
+    The whole column is decoded at once, so it is held in memory as Python strings like a parsed column would be.
+    """
+    decoded_text = text.tobytes().decode("utf-8")
+    cells = [decoded_text[start:end] for start, end in zip(offsets[:-1].tolist(), offsets[1:].tolist())]
+
+    series = pd.Series(cells, dtype=object)
+    series[missing] = np.nan # empty cells are put back so they are removed like any other empty cell
+    return series
+
+def read_snapshot(cache_key, selected_columns=None):
+    """
+    Returns the DataFrame saved in a snapshot, loading each column from its .npy files instead of parsing the file.
+    Every selected column is loaded in full: text columns are decoded into strings and numeric columns are copied into the DataFrame.
+    Returns None if there is no snapshot, or if it doesn't hold every column that is needed.
+    """
+    try:
+        if cache_key is None:
+            return None
+
+        snapshot_folder = get_snapshot_folder(cache_key)
+        manifest = read_manifest(snapshot_folder)
+        if manifest is None:
+            return None
+
+        if selected_columns is None:
+            if manifest["headers"] is None: # every column is needed, but only some have been saved
+                return None
+            column_names = manifest["headers"]
+        else:
+            column_names = list(selected_columns)
+
+        saved_columns = {column["name"]: column for column in manifest["columns"]}
+        if any(column_name not in saved_columns for column_name in column_names):
+            return None
+
+        data = {}
+        for column_name in column_names:
+            column = saved_columns[column_name]
+            values = np.load(os.path.join(snapshot_folder, column["file"]), mmap_mode="r") # mapped rather than read into a buffer first, as the values are copied into the column straight away
+
+            if column["kind"] == "text":
+                offsets = np.load(os.path.join(snapshot_folder, column["offsets_file"]), mmap_mode="r")
+                missing = np.load(os.path.join(snapshot_folder, column["missing_file"]), mmap_mode="r")
+                data[column_name] = decode_text_column(values, offsets, missing)
+            else:
+                data[column_name] = pd.Series(values)
+
+        os.utime(os.path.join(snapshot_folder, "manifest.json")) # the manifest's modification time records when the snapshot was last used
+        return pd.DataFrame(data, columns=column_names)
+    except Exception as e:
+        traceback.print_exc()
+        return None # the file is parsed instead
+
+def write_snapshot(cache_key, dataframe, is_complete):
+    """
+    Saves the columns of a DataFrame to a snapshot. Numeric columns are saved as they are.
+    Text columns are saved as UTF-8 text with the offsets of each cell (see encode_text_column),
+    because numpy can only save arrays that hold Python objects by pickling them.
+    is_complete should be True when the DataFrame holds every column of the file.
+    Columns are added to an existing snapshot, so reading different columns of a file builds up one snapshot.
+    Nothing is saved if the snapshot would be bigger than SNAPSHOT_CACHE_MAX_BYTES.
+    """
+    try:
+        if cache_key is None:
+            return
+
+        with snapshot_lock:
+            snapshot_folder = get_snapshot_folder(cache_key)
+            manifest = read_manifest(snapshot_folder)
+
+            if manifest is None or manifest["row_count"] != len(dataframe): # a snapshot with a different number of rows can't be combined with this one
+                shutil.rmtree(snapshot_folder, ignore_errors=True) # removes files left by an older or incomplete snapshot
+                manifest = {"version": snapshot_format_version, "headers": None, "row_count": len(dataframe), "columns": []}
+            os.makedirs(snapshot_folder, exist_ok=True)
+
+            saved_names = [column["name"] for column in manifest["columns"]]
+            new_files = [] # (file name, array) pairs, only written once the size of the snapshot is known
+
+            for column_name in dataframe.columns:
+                if column_name in saved_names:
+                    continue
+
+                column_number = len(manifest["columns"])
+                column_data = dataframe[column_name]
+                column = {"name": column_name, "file": f"column_{column_number}.npy"}
+
+                if pd.api.types.is_numeric_dtype(column_data):
+                    column["kind"] = "numeric"
+                    new_files.append((column["file"], column_data.to_numpy()))
+                else:
+                    column["kind"] = "text"
+                    column["offsets_file"] = f"column_{column_number}_offsets.npy"
+                    column["missing_file"] = f"column_{column_number}_missing.npy"
+                    text, offsets, missing = encode_text_column(column_data)
+                    new_files += [(column["file"], text), (column["offsets_file"], offsets), (column["missing_file"], missing)]
+
+                manifest["columns"].append(column)
+
+            snapshot_size = get_folder_size(snapshot_folder) + sum(array.nbytes for file_name, array in new_files)
+            if snapshot_size > config.SNAPSHOT_CACHE_MAX_BYTES: # the snapshot would push every other snapshot out of the cache, so the file is just parsed each time
+                if not saved_names:
+                    shutil.rmtree(snapshot_folder, ignore_errors=True)
+                return
+
+            for file_name, array in new_files:
+                np.save(os.path.join(snapshot_folder, file_name), array)
+
+            if is_complete:
+                manifest["headers"] = list(dataframe.columns)
+
+            # the manifest is written last and swapped in whole, so a snapshot is never read while it is half written
+            temporary_manifest_path = os.path.join(snapshot_folder, "manifest.json.tmp")
+            with open(temporary_manifest_path, "w") as file:
+                json.dump(manifest, file)
+            os.replace(temporary_manifest_path, os.path.join(snapshot_folder, "manifest.json"))
+
+            evict_snapshots(cache_key)
+    except Exception as e:
+        traceback.print_exc() # the results are still generated, they just aren't cached
+
+def get_folder_size(folder):
+    """
+    Returns the total size in bytes of the files in a folder.
+    """
+    total_size = 0
+
+    with os.scandir(folder) as directory_entries:
+        for directory_entry in directory_entries:
+            if directory_entry.is_file():
+                total_size += directory_entry.stat().st_size
+
+    return total_size
+
+def evict_snapshots(keep_cache_key):
+    """
+    Deletes the least recently used snapshots until the cache is smaller than SNAPSHOT_CACHE_MAX_BYTES.
+    The snapshot that has just been written is always kept, and so is any snapshot written or read
+    in the last SNAPSHOT_EVICTION_GRACE_SECONDS. snapshot_lock only covers this process, so another
+    process may still be writing a recent snapshot, even one that doesn't have a manifest yet.
+    """
+    try:
+        snapshots = []
+
+        with os.scandir(config.SNAPSHOT_CACHE_FOLDER) as directory_entries:
+            for directory_entry in directory_entries:
+                if not directory_entry.is_dir():
+                    continue
+
+                manifest_path = os.path.join(directory_entry.path, "manifest.json")
+                last_used = os.stat(manifest_path).st_mtime if os.path.exists(manifest_path) else 0 # snapshots without a manifest are incomplete, so are deleted first
+                last_changed = max(last_used, directory_entry.stat().st_mtime) # the folder's modification time changes whenever a file is added to it
+                snapshots.append((last_used, directory_entry.name, get_folder_size(directory_entry.path), last_changed))
+
+        cache_size = sum(snapshot_size for last_used, cache_key, snapshot_size, last_changed in snapshots)
+        recent_time = time.time() - config.SNAPSHOT_EVICTION_GRACE_SECONDS
+
+        for last_used, cache_key, snapshot_size, last_changed in sorted(snapshots): # oldest first
+            if cache_size <= config.SNAPSHOT_CACHE_MAX_BYTES:
+                break
+            if cache_key == keep_cache_key or last_changed > recent_time:
+                continue
+
+            shutil.rmtree(get_snapshot_folder(cache_key), ignore_errors=True)
+            cache_size -= snapshot_size
+    except Exception as e:
+        traceback.print_exc()
@@ -1,58 +1,372 @@
-""" 
+"""
 This file is part of Gene Matcher.
 Licensed under the Creative Commons Attribution-NonCommercial 4.0 International License.
 See LICENSE file for details: https://creativecommons.org/licenses/by-nc/4.0/
 """
 import config
 import os
+import json
 import traceback
+import atexit
+import queue
+import sqlite3
+import threading
+import time
+import uuid
+from datetime import datetime
 from tkinter import messagebox
+import pandas as pd
 
 """
 FUNCTIONS
 
 def read_number_from_file
-def write_number_to_file
-def increment_number_in_file
-def track_uses
+def connect_to_run_history
+def setup_run_history
+def create_run_stats
+def add_stage_time
+def add_to_run_stats
+def record_run
+def write_runs
+def run_history_writer_loop
+def start_run_history_writer
+def stop_run_history_writer
+def get_number_of_uses
+def query_run_history
+def read_settings
+def save_setting
 """
 
+# Global variables
+settings_lock = threading.Lock()
+run_history_queue = queue.Queue() # runs waiting to be written by the writer thread
+run_history_writer = None
+unwritten_run_count = 0 # runs that have been recorded but not yet committed to the database
+unwritten_run_count_lock = threading.Lock()
+run_stats_lock = threading.Lock() # run stats can be updated by several worker threads at the same time
+
 def read_number_from_file(file_path):
     """Reads a number from a text file. Returns 0 if the file does not exist or is empty."""
     try:
+        if not os.path.exists(file_path):
+            return 0
 
-        with open(config.NUMBER_OF_USES_FILE, "r") as file: #open file in read mode. which ensures file is closed properly, even if an error occurs
+        with open(file_path, "r") as file: #open file in read mode. which ensures file is closed properly, even if an error occurs
             content = file.read().strip()
             if content.isdigit():  # Check if the content is a valid integer
-                number = int(content) 
+                number = int(content)
             else:
                 number = 0  # Default to 0 if content is not a valid number
 
-            return number  
+            return number
     except Exception as e:
         traceback.print_exc()
         messagebox.showerror("Error", f"An error occurred in read_number_from_file: {e}")
         return 0
 
-def write_number_to_file(file_path, number):
-    """Wipes the file clean and writes a new number to it."""
+def connect_to_run_history():
+    """
+    Opens a connection to the run history database.
+    WAL mode lets readers and a writer from different processes use the database at the same time,
+    and the busy timeout makes writers wait for each other instead of failing.
+    """
+    try:
+        connection = sqlite3.connect(config.RUN_HISTORY_DATABASE, timeout=10)
+        connection.execute("PRAGMA journal_mode=WAL")
+        connection.execute("PRAGMA synchronous=NORMAL") # safe in WAL mode and avoids a disk sync on every commit
+        return connection
+    except Exception as e:
+        traceback.print_exc()
+        messagebox.showerror("Error", f"An error occurred in connect_to_run_history: {e}")
+
+def setup_run_history():
+    """
+    Creates the run history tables if they don't exist, imports the count from the
+    legacy number_of_uses.txt file once and starts the background writer.
+    """
+    try:
+        connection = connect_to_run_history()
+
+        with connection: # commits the transaction, or rolls it back if an error occurs
+            connection.execute("""
+                CREATE TABLE IF NOT EXISTS runs (
+                    run_id TEXT PRIMARY KEY,
+                    finished_at TEXT NOT NULL,
+                    source_name TEXT,
+                    input_bytes INTEGER,
+                    input_rows INTEGER,
+                    match_count INTEGER,
+                    total_seconds REAL,
+                    succeeded INTEGER NOT NULL
+                )
+            """)
+            connection.execute("""
+                CREATE TABLE IF NOT EXISTS stage_timings (
+                    run_id TEXT NOT NULL REFERENCES runs(run_id),
+                    stage TEXT NOT NULL,
+                    seconds REAL NOT NULL,
+                    PRIMARY KEY (run_id, stage)
+                )
+            """)
+            connection.execute("CREATE INDEX IF NOT EXISTS runs_finished_at ON runs(finished_at)")
+            connection.execute("""
+                CREATE TABLE IF NOT EXISTS metadata (
+                    key TEXT PRIMARY KEY,
+                    value TEXT NOT NULL
+                )
+            """)
+
+            # INSERT OR IGNORE means only the first process to get here imports the legacy count
+            legacy_uses = read_number_from_file(config.NUMBER_OF_USES_FILE)
+            connection.execute("INSERT OR IGNORE INTO metadata (key, value) VALUES ('legacy_uses', ?)", (str(legacy_uses),))
+
+        connection.close()
+        start_run_history_writer()
+
+    except Exception as e:
+        traceback.print_exc()
+        messagebox.showerror("Error", f"An error occurred in setup_run_history: {e}")
+
+def create_run_stats():
+    """
+    Creates the object that the processing functions fill in with the size and timings of a run.
+    """
+    return {
+        "input_rows": 0,
+        "match_count": 0,
+        "stage_timings": {} # stage name: seconds spent in that stage
+    }
+
+def add_stage_time(run_stats, stage, seconds):
+    """
+    Adds the time spent in a stage to the run stats. Does nothing if no run stats are being collected.
+    """
+    try:
+        if run_stats is None:
+            return
+
+        with run_stats_lock:
+            stage_timings = run_stats["stage_timings"]
+            stage_timings[stage] = stage_timings.get(stage, 0) + seconds
+    except Exception as e:
+        traceback.print_exc()
+        messagebox.showerror("Error", f"An error occurred in add_stage_time: {e}")
+
+def add_to_run_stats(run_stats, key, amount):
+    """
+    Adds an amount to one of the counts in the run stats. Does nothing if no run stats are being collected.
+    """
+    try:
+        if run_stats is None:
+            return
+
+        with run_stats_lock:
+            run_stats[key] += amount
+    except Exception as e:
+        traceback.print_exc()
+        messagebox.showerror("Error", f"An error occurred in add_to_run_stats: {e}")
+
+def record_run(source_name, input_bytes, run_stats, total_seconds, succeeded):
+    """
+    Queues a run to be written to the run history database by the background writer.
+    Returns immediately so the GUI never waits on the disk.
+    """
+    try:
+        global unwritten_run_count
+
+        run = {
+            "run_id": uuid.uuid4().hex, # generated here so stage timings can reference the run before it is written
+            "finished_at": datetime.now().isoformat(timespec="seconds"),
+            "source_name": source_name,
+            "input_bytes": input_bytes,
+            "input_rows": run_stats["input_rows"],
+            "match_count": run_stats["match_count"],
+            "total_seconds": total_seconds,
+            "succeeded": int(succeeded),
+            "stage_timings": dict(run_stats["stage_timings"])
+        }
+
+        with unwritten_run_count_lock:
+            unwritten_run_count += 1
+
+        run_history_queue.put(run)
+    except Exception as e:
+        traceback.print_exc()
+        messagebox.showerror("Error", f"An error occurred in record_run: {e}")
+
+def write_runs(connection, runs):
+    """
+    Writes a batch of runs and their stage timings to the database in a single transaction.
+    """
+    try:
+        global unwritten_run_count
+
+        run_rows = [
+            (run["run_id"], run["finished_at"], run["source_name"], run["input_bytes"], run["input_rows"], run["match_count"], run["total_seconds"], run["succeeded"])
+            for run in runs
+        ]
+        stage_rows = [
+            (run["run_id"], stage, seconds)
+            for run in runs
+            for stage, seconds in run["stage_timings"].items()
+        ]
+
+        with connection:
+            connection.executemany("INSERT INTO runs VALUES (?, ?, ?, ?, ?, ?, ?, ?)", run_rows)
+            connection.executemany("INSERT INTO stage_timings VALUES (?, ?, ?)", stage_rows)
+    except Exception as e:
+        traceback.print_exc() # no pop up, as this runs on the writer thread after the user has moved on
+    finally:
+        with unwritten_run_count_lock:
+            unwritten_run_count -= len(runs)
+
+def run_history_writer_loop():
+    """
+    Runs on the background writer thread. Waits for runs to be recorded, gathers them into
+    batches and writes each batch in one transaction. Stops when it receives None.
+    """
+    try:
+        connection = connect_to_run_history()
+        stopping = False
+
+        while not stopping:
+            run = run_history_queue.get() # blocks until a run is recorded
+            if run is None:
+                break
+
+            batch = [run]
+            deadline = time.monotonic() + config.RUN_HISTORY_FLUSH_SECONDS
+
+            while len(batch) < config.RUN_HISTORY_BATCH_SIZE:
+                remaining_seconds = deadline - time.monotonic()
+                if remaining_seconds <= 0:
+                    break
+                try:
+                    run = run_history_queue.get(timeout=remaining_seconds)
+                except queue.Empty:
+                    break
+                if run is None:
+                    stopping = True
+                    break
+                batch.append(run)
+
+            write_runs(connection, batch)
+
+        connection.close()
+    except Exception as e:
+        traceback.print_exc()
+
+def start_run_history_writer():
+    """
+    Starts the background thread that writes runs to the database, if it is not already running.
+    """
     try:
-        with open(file_path, "w") as file:
-            file.write(str(number))  # Write the new number as a string
+        global run_history_writer
+
+        if run_history_writer is not None and run_history_writer.is_alive():
+            return
+
+        run_history_writer = threading.Thread(target=run_history_writer_loop, daemon=True) # daemon threads don't stop the app from closing
+        run_history_writer.start()
+        atexit.register(stop_run_history_writer) # writes any queued runs when the app closes
+    except Exception as e:
+        traceback.print_exc()
+        messagebox.showerror("Error", f"An error occurred in start_run_history_writer: {e}")
+
+def stop_run_history_writer():
+    """
+    Writes any queued runs and stops the background writer.
+    """
+    try:
+        global run_history_writer
+
+        if run_history_writer is None:
+            return
 
+        run_history_queue.put(None)
+        run_history_writer.join(timeout=10)
+        run_history_writer = None
     except Exception as e:
         traceback.print_exc()
-        messagebox.showerror("Error", f"An error occurred in write_number_to_file: {e}")
 
-def track_use():
-    """Reads the number, increments it by 1, and writes it back to the file."""
+def get_number_of_uses():
+    """
+    Returns the number of times the app has been used: the legacy count, plus every run
+    in the database, plus runs that are still waiting to be written.
+    """
     try:
-        number = read_number_from_file(config.NUMBER_OF_USES_FILE)
-        number += 1  
-        write_number_to_file(config.NUMBER_OF_USES_FILE, number)
+        connection = connect_to_run_history()
+        legacy_uses = connection.execute("SELECT value FROM metadata WHERE key = 'legacy_uses'").fetchone()
+        recorded_runs = connection.execute("SELECT COUNT(*) FROM runs").fetchone()[0]
+        connection.close()
+
+        number = recorded_runs + unwritten_run_count
+        if legacy_uses:
+            number += int(legacy_uses[0])
+
         return number
+    except Exception as e:
+        traceback.print_exc()
+        messagebox.showerror("Error", f"An error occurred in get_number_of_uses: {e}")
+        return None
+
+def query_run_history(limit=100):
+    """
+    Returns the most recent runs as a DataFrame, with one '<stage> seconds' column per stage,
+    so processing performance can be tracked over time.
+    """
+    try:
+        connection = connect_to_run_history()
+        runs_df = pd.read_sql_query(
+            "SELECT * FROM runs ORDER BY finished_at DESC LIMIT ?",
+            connection,
+            params=(limit,)
+        )
+        stages_df = pd.read_sql_query(
+            "SELECT stage_timings.* FROM stage_timings JOIN (SELECT run_id FROM runs ORDER BY finished_at DESC LIMIT ?) AS recent USING (run_id)",
+            connection,
+            params=(limit,)
+        )
+        connection.close()
+
+        if stages_df.empty:
+            return runs_df
+
+        stage_columns = stages_df.pivot(index="run_id", columns="stage", values="seconds") # one row per run, one column per stage
+        stage_columns.columns = [f"{stage} seconds" for stage in stage_columns.columns]
+
+        return runs_df.merge(stage_columns, how="left", left_on="run_id", right_index=True)
+    except Exception as e:
+        traceback.print_exc()
+        messagebox.showerror("Error", f"An error occurred in query_run_history: {e}")
+
+def read_settings():
+    """
+    Returns the settings saved by save_setting, or an empty dictionary if none have been saved.
+    """
+    try:
+        with open(config.SETTINGS_FILE, "r") as file:
+            return json.load(file)
+    except (FileNotFoundError, ValueError):
+        return {}
+    except Exception as e:
+        traceback.print_exc()
+        messagebox.showerror("Error", f"An error occurred in read_settings: {e}")
+        return {}
+
+def save_setting(key, value):
+    """
+    Saves a setting so it is kept between sessions. The file is replaced whole, so it is never left half written.
+    """
+    try:
+        with settings_lock:
+            settings = read_settings()
+            settings[key] = value
 
+            temporary_settings_path = config.SETTINGS_FILE + ".tmp"
+            with open(temporary_settings_path, "w") as file:
+                json.dump(settings, file)
+            os.replace(temporary_settings_path, config.SETTINGS_FILE)
     except Exception as e:
         traceback.print_exc()
-        messagebox.showerror("Error", f"An error occurred in increment_number_in_file: {e}")
-        return None
\ No newline at end of file
+        messagebox.showerror("Error", f"An error occurred in save_setting: {e}")
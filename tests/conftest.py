@@ -0,0 +1,12 @@
+"""
+This file is part of Gene Matcher.
+Licensed under the Creative Commons Attribution-NonCommercial 4.0 International License.
+See LICENSE file for details: https://creativecommons.org/licenses/by-nc/4.0/
+"""
+import os
+import sys
+import tempfile
+
+sys.dont_write_bytecode = True
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__)))) # lets the tests import config and modules from the root folder
+os.environ.setdefault("APPDATA", tempfile.mkdtemp()) # config builds every folder path from APPDATA, so it must be set before config is imported
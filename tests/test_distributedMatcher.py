@@ -0,0 +1,100 @@
+"""
+This file is part of Gene Matcher.
+Licensed under the Creative Commons Attribution-NonCommercial 4.0 International License.
+See LICENSE file for details: https://creativecommons.org/licenses/by-nc/4.0/
+"""
+import os
+import pytest
+import config
+from modules import distributedMatcher
+from modules.distributedMatcher import create_coordinator_state, claim_job, complete_job, fail_job, is_finished
+
+@pytest.fixture
+def clock(monkeypatch):
+    """
+    Replaces time.monotonic with a clock the test moves forward itself.
+    """
+    clock = {"now": 1000.0}
+    monkeypatch.setattr(distributedMatcher.time, "monotonic", lambda: clock["now"])
+    return clock
+
+@pytest.fixture
+def saved_files(tmp_path, monkeypatch):
+    monkeypatch.setattr(config, "RESULTS_FOLDER", str(tmp_path))
+    saved_files = []
+
+    def fake_save_file(dataframe, file_name, destination_folder, source_name=None):
+        saved_files.append(file_name)
+        return os.path.join(destination_folder, file_name)
+
+    monkeypatch.setattr(distributedMatcher, "save_file", fake_save_file)
+    return saved_files
+
+def test_expired_lease_returns_the_job_to_pending_until_it_runs_out_of_attempts(clock):
+    state = create_coordinator_state(["genes.csv"])
+
+    for attempt in range(1, config.DISTRIBUTED_MAX_ATTEMPTS + 1):
+        job = claim_job(state, f"worker-{attempt}")
+        assert job["job_id"] == "1"
+        assert state["jobs"]["1"]["attempts"] == attempt
+        clock["now"] += config.DISTRIBUTED_LEASE_SECONDS + 1 # the worker stops responding
+
+    assert claim_job(state, "worker-last") is None
+    assert state["jobs"]["1"]["status"] == "failed"
+    assert is_finished(state)
+
+def test_running_jobs_are_only_stolen_after_the_steal_time(clock):
+    state = create_coordinator_state(["genes.csv"])
+    claim_job(state, "slow-worker")
+
+    clock["now"] += config.DISTRIBUTED_STEAL_SECONDS - 1
+    assert claim_job(state, "idle-worker") is None
+
+    clock["now"] += 2
+    job = claim_job(state, "idle-worker")
+    assert job["job_id"] == "1"
+    assert set(state["jobs"]["1"]["claimed_at"]) == {"slow-worker", "idle-worker"}
+    assert state["jobs"]["1"]["attempts"] == 1 # stealing is not a new attempt
+
+    assert claim_job(state, "slow-worker") is None # a worker is never given a job it is already running
+
+def test_only_the_first_results_of_a_stolen_job_are_kept(clock, saved_files):
+    state = create_coordinator_state(["genes.csv"])
+    claim_job(state, "slow-worker")
+    clock["now"] += config.DISTRIBUTED_STEAL_SECONDS + 1
+    claim_job(state, "idle-worker")
+
+    complete_job(state, "1", "idle-worker", [{"Gene": "BRCA1"}], 1.0)
+    complete_job(state, "1", "slow-worker", [{"Gene": "BRCA1"}], 2.0)
+
+    job = state["jobs"]["1"]
+    assert job["status"] == "done"
+    assert job["worker_id"] == "idle-worker"
+    assert saved_files == ["genes_results.csv"]
+    assert is_finished(state)
+
+def test_a_failure_is_ignored_while_another_worker_still_runs_the_job(clock):
+    state = create_coordinator_state(["genes.csv"])
+    claim_job(state, "slow-worker")
+    clock["now"] += config.DISTRIBUTED_STEAL_SECONDS + 1
+    claim_job(state, "idle-worker")
+
+    fail_job(state, "1", "slow-worker", "boom")
+    assert state["jobs"]["1"]["status"] == "running"
+    assert list(state["jobs"]["1"]["claimed_at"]) == ["idle-worker"]
+
+    fail_job(state, "1", "idle-worker", "boom")
+    assert state["jobs"]["1"]["status"] == "pending" # retried, as it has only been attempted once
+    assert not is_finished(state)
+
+def test_a_job_whose_results_cannot_be_saved_is_run_again(clock, tmp_path, monkeypatch):
+    monkeypatch.setattr(config, "RESULTS_FOLDER", str(tmp_path))
+    monkeypatch.setattr(distributedMatcher, "save_file", lambda *args, **kwargs: None)
+    state = create_coordinator_state(["genes.csv"])
+    claim_job(state, "worker")
+
+    complete_job(state, "1", "worker", [{"Gene": "BRCA1"}], 1.0)
+
+    assert state["jobs"]["1"]["status"] == "pending"
+    assert list(tmp_path.iterdir()) == [] # the reserved results file is removed
+    assert claim_job(state, "worker")["job_id"] == "1"
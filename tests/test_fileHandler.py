@@ -0,0 +1,56 @@
+"""
+This file is part of Gene Matcher.
+Licensed under the Creative Commons Attribution-NonCommercial 4.0 International License.
+See LICENSE file for details: https://creativecommons.org/licenses/by-nc/4.0/
+"""
+import os
+import sqlite3
+import pandas as pd
+import pytest
+import config
+from modules.documentGenerator import generate_document, create_summary_options
+from modules.fileHandler import save_file, reserve_unique_file_name
+
+@pytest.fixture(autouse=True)
+def snapshot_cache_folder(tmp_path, monkeypatch):
+    monkeypatch.setattr(config, "SNAPSHOT_CACHE_FOLDER", str(tmp_path / "cache"))
+
+@pytest.mark.parametrize("summary_options", [None, create_summary_options(min_occurrences=99)])
+def test_results_with_zero_matches_keep_their_columns(tmp_path, summary_options):
+    input_path = tmp_path / "genes.csv"
+    pd.DataFrame({"Set A": ["BRCA1", "TP53"], "Set B": ["EGFR", "KRAS"]}).to_csv(input_path, index=False)
+
+    results_df = generate_document(str(input_path), summary_options=summary_options)
+
+    assert results_df.empty
+    assert list(results_df.columns) == ["Gene", "Column 1", "Column 2"]
+
+    xlsx_path = save_file(results_df, "genes_results.xlsx", str(tmp_path), "genes.csv")
+    assert list(pd.read_excel(xlsx_path).columns) == ["Gene", "Column 1", "Column 2"]
+
+    sqlite_path = save_file(results_df, "genes_results.sqlite", str(tmp_path), "genes.csv")
+    assert sqlite_path is not None
+    with sqlite3.connect(sqlite_path) as connection:
+        assert connection.execute("SELECT COUNT(*) FROM genes").fetchone()[0] == 0
+        assert connection.execute("SELECT source_name, column_name FROM sets").fetchall() == [("genes.csv", "Column 1"), ("genes.csv", "Column 2")]
+
+def test_sqlite_results_tolerate_a_dataframe_without_columns(tmp_path):
+    sqlite_path = save_file(pd.DataFrame(), "empty_results.sqlite", str(tmp_path), "empty.csv")
+
+    assert sqlite_path is not None
+    with sqlite3.connect(sqlite_path) as connection:
+        assert connection.execute("SELECT COUNT(*) FROM gene_set_counts").fetchone()[0] == 0
+
+def test_sqlite_results_are_written_into_the_reserved_placeholder(tmp_path):
+    results_df = pd.DataFrame({"Gene": ["TP53"], "Column 1": [[2]], "Column 2": [[3]]})
+    file_name = reserve_unique_file_name("genes_results.sqlite", str(tmp_path))
+    placeholder_inode = os.stat(tmp_path / file_name).st_ino
+
+    sqlite_path = save_file(results_df, file_name, str(tmp_path), "genes.csv")
+
+    assert os.stat(sqlite_path).st_ino == placeholder_inode # the empty placeholder is written into, never removed and created again
+    assert reserve_unique_file_name("genes_results.sqlite", str(tmp_path)) == "genes_results_2.sqlite"
+
+    sqlite_path = save_file(results_df.iloc[:0], file_name, str(tmp_path), "genes.csv") # an existing database is still replaced
+    with sqlite3.connect(sqlite_path) as connection:
+        assert connection.execute("SELECT COUNT(*) FROM genes").fetchone()[0] == 0
@@ -0,0 +1,70 @@
+"""
+This file is part of Gene Matcher.
+Licensed under the Creative Commons Attribution-NonCommercial 4.0 International License.
+See LICENSE file for details: https://creativecommons.org/licenses/by-nc/4.0/
+"""
+import numpy as np
+import pandas as pd
+import pytest
+import config
+from modules.documentGenerator import generate_document
+from modules.geneMatcher import GeneMatcher
+
+@pytest.fixture(autouse=True)
+def snapshot_cache_folder(tmp_path, monkeypatch):
+    monkeypatch.setattr(config, "SNAPSHOT_CACHE_FOLDER", str(tmp_path / "cache"))
+
+@pytest.fixture
+def spreadsheet(tmp_path):
+    input_path = tmp_path / "genes.xlsx"
+    pd.DataFrame({
+        "Text": ["TP53", "BRCA1", "0", "7", "EGFR", "BRCA1", None, "3.5", "KRAS"],
+        "Numbers": [7, np.nan, 3, 7, 12, np.nan, 5, 8, 9], # empty cells count as 0
+        "Mixed": ["BRCA1", 7, 7.0, None, "TP53", 3.5, "0", "KRAS", 12],
+        "Reversed": ["KRAS", "EGFR", "7", "0", "BRCA1", "TP53", "3.5", "12", None]
+    }).to_excel(input_path, index=False)
+    return input_path
+
+@pytest.mark.parametrize("selected_columns", [
+    ["Text", "Numbers"],
+    ["Text", "Mixed"],
+    ["Numbers", "Mixed"],
+    ["Reversed", "Text"],
+    ["Text", "Mixed", "Reversed"]
+])
+def test_match_gives_the_same_results_as_generate_document(spreadsheet, selected_columns):
+    spreadsheet_df = pd.read_excel(spreadsheet)
+
+    document_df = generate_document(str(spreadsheet), selected_columns=selected_columns)
+    matcher_df = GeneMatcher().match(*[spreadsheet_df[column] for column in selected_columns])
+
+    assert len(matcher_df) > 0
+    assert list(matcher_df.columns) == list(document_df.columns)
+    assert matcher_df.to_dict(orient="records") == document_df.to_dict(orient="records") # same genes, positions and row order
+
+def test_match_many_indexes_a_shared_column_once(monkeypatch):
+    matcher = GeneMatcher()
+    built_indexes = []
+    build_index = matcher.build_index
+
+    def counting_build_index(values):
+        built_indexes.append(values)
+        return build_index(values)
+
+    monkeypatch.setattr(matcher, "build_index", counting_build_index)
+
+    reference = ["BRCA1", "TP53", "EGFR"]
+    samples = [["TP53"], ["EGFR", "BRCA1"], ["KRAS"]]
+    results = matcher.match_many([(reference, sample) for sample in samples])
+
+    assert len(built_indexes) == 1 + len(samples) # the reference once, plus each sample
+    assert sum(values is reference for values in built_indexes) == 1
+    assert [list(results_df["Gene"]) for results_df in results] == [["TP53"], ["BRCA1", "EGFR"], []]
+
+def test_match_many_accepts_a_generator_of_column_groups():
+    matcher = GeneMatcher()
+    matcher.add_column("reference", [f"G{number}" for number in range(200)])
+
+    results = matcher.match_many(("reference", [f"G{number}"]) for number in range(200))
+
+    assert [list(results_df["Gene"]) for results_df in results] == [[f"G{number}"] for number in range(200)]
@@ -0,0 +1,108 @@
+"""
+This file is part of Gene Matcher.
+Licensed under the Creative Commons Attribution-NonCommercial 4.0 International License.
+See LICENSE file for details: https://creativecommons.org/licenses/by-nc/4.0/
+"""
+import datetime
+import os
+import time
+import pandas as pd
+import pytest
+import config
+from modules import documentGenerator
+from modules.inputCache import evict_snapshots
+
+@pytest.fixture(autouse=True)
+def snapshot_cache_folder(tmp_path, monkeypatch):
+    cache_folder = tmp_path / "cache"
+    cache_folder.mkdir()
+    monkeypatch.setattr(config, "SNAPSHOT_CACHE_FOLDER", str(cache_folder))
+    return cache_folder
+
+def count_parses(monkeypatch):
+    parses = []
+    read_source_stream = documentGenerator.read_source_stream
+
+    def counting_read_source_stream(*args, **kwargs):
+        parses.append(args)
+        return read_source_stream(*args, **kwargs)
+
+    monkeypatch.setattr(documentGenerator, "read_source_stream", counting_read_source_stream)
+    return parses
+
+@pytest.mark.parametrize("selected_columns", [None, ["Dates", "Genes"]])
+def test_cached_run_matches_uncached_run(tmp_path, monkeypatch, selected_columns):
+    input_path = tmp_path / "genes.xlsx"
+    pd.DataFrame({
+        "Dates": [datetime.datetime(2024, 1, 2), datetime.datetime(2024, 1, 3), None, datetime.datetime(2024, 1, 5)],
+        "Genes": ["2024-01-02 00:00:00", "BRCA1", "TP53", "2024-01-05 00:00:00"],
+        "Numbers": [1, 2, 3, 4],
+        "Notes": ["a" * 5000, None, "TP53", "BRCA1"]
+    }).to_excel(input_path, index=False)
+    parses = count_parses(monkeypatch)
+
+    uncached_df = documentGenerator.generate_document(str(input_path), selected_columns=selected_columns)
+    cached_df = documentGenerator.generate_document(str(input_path), selected_columns=selected_columns)
+
+    assert len(parses) == 1 # the second run read the snapshot
+    assert len(uncached_df) == 2
+    pd.testing.assert_frame_equal(cached_df, uncached_df)
+
+def test_text_columns_with_empty_cells_round_trip(tmp_path, monkeypatch):
+    input_path = tmp_path / "genes.csv"
+    pd.DataFrame({
+        "Set A": ["BRCA1", None, "TP53", "ÄBC", "", "EGFR"],
+        "Set B": ["EGFR", "ÄBC", None, "BRCA1", "x", "TP53"]
+    }).to_csv(input_path, index=False)
+    parses = count_parses(monkeypatch)
+
+    uncached_df = documentGenerator.generate_document(str(input_path))
+    cached_df = documentGenerator.generate_document(str(input_path))
+
+    assert len(parses) == 1
+    pd.testing.assert_frame_equal(cached_df, uncached_df)
+
+def test_long_text_cells_only_take_up_their_own_space(tmp_path, monkeypatch, snapshot_cache_folder):
+    input_path = tmp_path / "genes.csv"
+    pd.DataFrame({
+        "Set A": [f"G{row}" for row in range(1000)],
+        "Set B": [f"G{row}" for row in range(1000)],
+        "Notes": ["a" * 5000] + [None] * 999
+    }).to_csv(input_path, index=False)
+
+    documentGenerator.generate_document(str(input_path))
+
+    snapshot_size = sum(path.stat().st_size for path in snapshot_cache_folder.rglob("*.npy"))
+    assert snapshot_size < 100_000 # fixed width strings would take 1000 rows x 20KB
+
+def test_snapshots_bigger_than_the_cache_are_not_saved(tmp_path, monkeypatch, snapshot_cache_folder):
+    monkeypatch.setattr(config, "SNAPSHOT_CACHE_MAX_BYTES", 1000)
+    input_path = tmp_path / "genes.csv"
+    pd.DataFrame({
+        "Set A": [f"G{row}" for row in range(1000)],
+        "Set B": [f"G{row}" for row in range(1000)]
+    }).to_csv(input_path, index=False)
+    parses = count_parses(monkeypatch)
+
+    uncached_df = documentGenerator.generate_document(str(input_path))
+    second_df = documentGenerator.generate_document(str(input_path))
+
+    assert list(snapshot_cache_folder.iterdir()) == []
+    assert len(parses) == 2
+    pd.testing.assert_frame_equal(second_df, uncached_df)
+
+def test_eviction_skips_snapshots_another_process_may_be_writing(monkeypatch, snapshot_cache_folder):
+    monkeypatch.setattr(config, "SNAPSHOT_CACHE_MAX_BYTES", 1000)
+    for cache_key in ["old", "old_incomplete", "being_written", "just_written"]:
+        (snapshot_cache_folder / cache_key).mkdir()
+        (snapshot_cache_folder / cache_key / "column_0.npy").write_bytes(b"0" * 1000)
+    for cache_key in ["old", "just_written"]:
+        (snapshot_cache_folder / cache_key / "manifest.json").write_text("{}")
+
+    an_hour_ago = time.time() - 3600
+    for path in [snapshot_cache_folder / "old" / "manifest.json", snapshot_cache_folder / "old", snapshot_cache_folder / "old_incomplete"]:
+        os.utime(path, (an_hour_ago, an_hour_ago))
+
+    evict_snapshots("just_written")
+
+    assert sorted(path.name for path in snapshot_cache_folder.iterdir()) == ["being_written", "just_written"] # the recent folder without a manifest is still being written, so is kept